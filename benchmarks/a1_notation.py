@@ -0,0 +1,37 @@
+"""Compares computing the range of a wide DataFrame with the A1 helpers against
+enumerating every column name from A, as update_range_from_df used to
+
+Run from the repository root with: python -m benchmarks.a1_notation
+"""
+import itertools
+import string
+import timeit
+from ggvlib.google.a1 import column_to_index, index_to_column
+
+
+def legacy_end_column(start_col: int, width: int) -> str:
+    def excel_cols():
+        n = 1
+        while True:
+            yield from (
+                "".join(group)
+                for group in itertools.product(string.ascii_uppercase, repeat=n)
+            )
+            n += 1
+
+    return list(itertools.islice(excel_cols(), start_col + width))[-1]
+
+
+def end_column(start_col: int, width: int) -> str:
+    return index_to_column(start_col + width - 1)
+
+
+if __name__ == "__main__":
+    for start, width in [("A", 10), ("Z", 500), ("AAA", 5000)]:
+        start_col = column_to_index(start)
+        assert legacy_end_column(start_col, width) == end_column(start_col, width)
+        for name, func in [("legacy", legacy_end_column), ("a1", end_column)]:
+            seconds = timeit.timeit(lambda: func(start_col, width), number=200) / 200
+            print(
+                f"{name:>6} start={start:<4} width={width:<5} {seconds * 1e6:10.1f}us"
+            )
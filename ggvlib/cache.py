@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Hashable, Optional, Tuple
+import pandas as pd
+from ggvlib.logging import logger
+
+
+class ParquetCache:
+    """A local disk cache for DataFrames stored as Parquet files. Entries expire after
+    a time to live and the least recently used entries are evicted once the cache
+    grows past a maximum size
+
+    >>> cache = ParquetCache("/tmp/ggvlib-cache", ttl=600)
+    >>> cache.set("key", pd.DataFrame({"a": [1]}))
+    >>> cache.get("key")
+       a
+    0  1
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        ttl: int = 3600,
+        max_bytes: int = 1024 * 1024 * 1024,
+    ) -> None:
+        """Creates the cache directory if it doesn't exist
+
+        Args:
+            directory (str): The directory to store cached files in
+            ttl (int, optional): How many seconds an entry stays valid. Defaults to 3600.
+            max_bytes (int, optional): The maximum total size of the cache. Defaults to 1GB.
+        """
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.parquet"
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Returns a cached DataFrame if it exists and hasn't expired
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            Optional[pd.DataFrame]: The cached DataFrame or None
+        """
+        path = self._path(key)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        now = time.time()
+        if now - stat.st_mtime > self.ttl:
+            logger.debug(f"Cache entry {key} expired")
+            path.unlink(missing_ok=True)
+            return None
+        # The access time tracks recency for eviction, the modified time tracks the ttl
+        os.utime(path, (now, stat.st_mtime))
+        logger.debug(f"Cache hit: {key}")
+        return pd.read_parquet(path)
+
+    def set(self, key: str, df: pd.DataFrame) -> None:
+        """Stores a DataFrame in the cache and evicts old entries if the cache is full
+
+        Args:
+            key (str): The cache key
+            df (pd.DataFrame): The DataFrame to store
+        """
+        path = self._path(key)
+        temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        df.to_parquet(temp_path, index=False)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes expired entries, then the least recently used entries until the
+        cache is smaller than max_bytes
+        """
+        now = time.time()
+        entries = []
+        for path in self.directory.glob("*.parquet"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((stat.st_atime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            logger.debug(f"Evicting cache entry {path.stem}")
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        """Removes every entry from the cache"""
+        for path in self.directory.glob("*.parquet"):
+            path.unlink(missing_ok=True)
+
+
+class TTLCache:
+    """A thread safe in-memory cache whose entries expire after a time to live
+
+    >>> cache = TTLCache(ttl=300)
+    >>> cache.set("key", {"a": 1})
+    >>> cache.get("key")
+    {'a': 1}
+    """
+
+    def __init__(self, ttl: int = 300) -> None:
+        """
+        Args:
+            ttl (int, optional): How many seconds an entry stays valid. Defaults to 300.
+        """
+        self.ttl = ttl
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns a cached value if it exists and hasn't expired
+
+        Args:
+            key (Hashable): The cache key
+            default (Any, optional): What to return when there is no valid entry. Defaults to None.
+
+        Returns:
+            Any: The cached value or the default
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                return default
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Stores a value in the cache
+
+        Args:
+            key (Hashable): The cache key
+            value (Any): The value to store
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Removes an entry from the cache if it exists
+
+        Args:
+            key (Hashable): The cache key
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes every entry from the cache"""
+        with self._lock:
+            self._entries.clear()
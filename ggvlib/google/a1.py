@@ -0,0 +1,201 @@
+import re
+from typing import NamedTuple, Optional
+
+A1_PATTERN = re.compile(
+    r"^(?:(?P<sheet>'(?:[^']|'')+'|[^'!]+)!)?"
+    r"(?P<start_col>[A-Za-z]{0,3})(?P<start_row>[0-9]*)"
+    r"(?::(?P<end_col>[A-Za-z]{0,3})(?P<end_row>[0-9]*))?$"
+)
+CELL_PATTERN = re.compile(r"^[A-Za-z]{1,3}[0-9]+$")
+UNQUOTED_SHEET_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class A1Range(NamedTuple):
+    """A range in A1 notation. Columns are 0-based indexes and rows are 1-based row
+    numbers, as shown in the sheet. Parts which are not bounded are None, ie the rows
+    of Sheet1!A:C or everything in Sheet1
+    """
+
+    sheet: Optional[str] = None
+    start_col: Optional[int] = None
+    start_row: Optional[int] = None
+    end_col: Optional[int] = None
+    end_row: Optional[int] = None
+
+    def __str__(self) -> str:
+        return format_range(self)
+
+    @property
+    def rows(self) -> Optional[int]:
+        if self.start_row is None or self.end_row is None:
+            return None
+        return self.end_row - self.start_row + 1
+
+    @property
+    def cols(self) -> Optional[int]:
+        if self.start_col is None or self.end_col is None:
+            return None
+        return self.end_col - self.start_col + 1
+
+
+def column_to_index(letters: str) -> int:
+    """Converts column letters to a 0-based column index
+
+    Args:
+        letters (str): The column letters, ie AB
+
+    Raises:
+        ValueError: If the letters are not a valid column
+
+    Returns:
+        int: The index
+
+    >>> column_to_index("AB")
+    27
+    """
+    index = 0
+    for letter in letters.upper():
+        value = ord(letter) - 64
+        if not 1 <= value <= 26:
+            raise ValueError(f"Invalid column: '{letters}'")
+        index = index * 26 + value
+    if not index:
+        raise ValueError(f"Invalid column: '{letters}'")
+    return index - 1
+
+
+def index_to_column(index: int) -> str:
+    """Converts a 0-based column index to column letters
+
+    Args:
+        index (int): The index
+
+    Raises:
+        ValueError: If the index is negative
+
+    Returns:
+        str: The column letters
+
+    >>> index_to_column(27)
+    'AB'
+    """
+    if index < 0:
+        raise ValueError(f"Invalid column index: {index}")
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def quote_sheet_name(sheet: str) -> str:
+    """Quotes a sheet name for use in A1 notation when it contains characters other
+    than letters, digits and underscores
+
+    Args:
+        sheet (str): The sheet name
+
+    Returns:
+        str: The sheet name, quoted if needed
+
+    >>> quote_sheet_name("Monthly KPIs")
+    "'Monthly KPIs'"
+    """
+    if UNQUOTED_SHEET_PATTERN.match(sheet):
+        return sheet
+    return "'" + sheet.replace("'", "''") + "'"
+
+
+def unquote_sheet_name(sheet: str) -> str:
+    if len(sheet) > 1 and sheet[0] == sheet[-1] == "'":
+        return sheet[1:-1].replace("''", "'")
+    return sheet
+
+
+def parse_range(a1: str) -> A1Range:
+    """Parses a range in A1 notation, ie 'Sheet 1'!B2:D10, Sheet1!A:C, Sheet1!5:7, B2 or Sheet1
+
+    Args:
+        a1 (str): The range
+
+    Raises:
+        ValueError: If the range is not valid A1 notation
+
+    Returns:
+        A1Range: The parsed range
+
+    >>> parse_range("'Monthly KPIs'!B2:D10")
+    A1Range(sheet='Monthly KPIs', start_col=1, start_row=2, end_col=3, end_row=10)
+    """
+    if "!" not in a1 and ":" not in a1 and not CELL_PATTERN.match(a1):
+        # A bare name like "Sheet1" refers to the whole sheet
+        return A1Range(sheet=unquote_sheet_name(a1))
+    match = A1_PATTERN.match(a1)
+    if not match:
+        raise ValueError(f"Invalid A1 notation: '{a1}'")
+    sheet, start_col, start_row, end_col, end_row = match.groups()
+    if end_col is None and end_row is None:
+        if not (start_col or start_row):
+            return A1Range(sheet=unquote_sheet_name(sheet))
+        end_col, end_row = start_col, start_row
+    return A1Range(
+        sheet=unquote_sheet_name(sheet) if sheet else None,
+        start_col=column_to_index(start_col) if start_col else None,
+        start_row=int(start_row) if start_row else None,
+        end_col=column_to_index(end_col) if end_col else None,
+        end_row=int(end_row) if end_row else None,
+    )
+
+
+def format_range(a1_range: A1Range) -> str:
+    """Formats a range in A1 notation, quoting the sheet name if needed
+
+    Args:
+        a1_range (A1Range): The range
+
+    Returns:
+        str: The range in A1 notation
+
+    >>> format_range(A1Range("Monthly KPIs", 1, 2, 3, 10))
+    "'Monthly KPIs'!B2:D10"
+    """
+    sheet = quote_sheet_name(a1_range.sheet) if a1_range.sheet else None
+    start = _cell(a1_range.start_col, a1_range.start_row)
+    end = _cell(a1_range.end_col, a1_range.end_row)
+    if not (start or end):
+        return sheet or ""
+    cells = start if start == end else f"{start}:{end}"
+    return f"{sheet}!{cells}" if sheet else cells
+
+
+def _cell(col: Optional[int], row: Optional[int]) -> str:
+    return (index_to_column(col) if col is not None else "") + (
+        str(row) if row is not None else ""
+    )
+
+
+def range_from_start(start: str, rows: int, cols: int) -> A1Range:
+    """Returns the range covered by a block of values written from a starting cell
+
+    Args:
+        start (str): The upper left cell, ie Sheet1!B2
+        rows (int): The number of rows in the block
+        cols (int): The number of columns in the block
+
+    Raises:
+        ValueError: If start is not a single cell
+
+    Returns:
+        A1Range: The range covered by the block
+
+    >>> str(range_from_start("Sheet1!B2", rows=3, cols=2))
+    'Sheet1!B2:C4'
+    """
+    cell = parse_range(start)
+    if cell.start_col is None or cell.start_row is None:
+        raise ValueError(f"Invalid start cell: '{start}'")
+    return cell._replace(
+        end_col=cell.start_col + max(cols, 1) - 1,
+        end_row=cell.start_row + max(rows, 1) - 1,
+    )
@@ -1,14 +1,75 @@
+import datetime
+import fnmatch
+import functools
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from abc import ABC, abstractmethod
+from decimal import Decimal
 import pandas as pd
+import pyarrow as pa
+from io import BytesIO
 import google.auth
-from typing import Union
-from google.cloud import bigquery, bigquery_storage
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Generator, List, Optional, Tuple, Union
+from google.cloud import bigquery, bigquery_storage, storage
 from google.cloud.bigquery.table import _EmptyRowIterator, RowIterator
+from pydantic import BaseModel, Field
+from ggvlib.cache import ParquetCache, TTLCache
 from ggvlib.logging import logger
 
 DEFAULT_SCOPES = [
     "https://www.googleapis.com/auth/drive",
     "https://www.googleapis.com/auth/bigquery",
 ]
+# Streaming inserts are limited to 10MB and 50,000 rows per request
+MAX_INSERT_ROWS = 10000
+MAX_INSERT_BYTES = 9 * 1024 * 1024
+RETRYABLE_INSERT_REASONS = {"backendError", "internalError", "stopped", "timeout"}
+# Payloads larger than this are written with a load job instead of streaming inserts
+BULK_LOAD_THRESHOLD_BYTES = 64 * 1024 * 1024
+WRITE_METHODS = ["auto", "streaming", "load"]
+# Matches quoted strings/identifiers (group 1) or runs of whitespace
+QUERY_TOKEN_PATTERN = re.compile(
+    r"""('(?:\\.|[^'\\])*'|"(?:\\.|[^"\\])*"|`(?:\\.|[^`\\])*`)|\s+"""
+)
+
+PARAMETER_TYPES = [
+    (bool, "BOOL"),
+    (int, "INT64"),
+    (float, "FLOAT64"),
+    (Decimal, "NUMERIC"),
+    (datetime.datetime, "DATETIME"),
+    (datetime.date, "DATE"),
+    (datetime.time, "TIME"),
+    (bytes, "BYTES"),
+    (str, "STRING"),
+]
+QueryParams = Union[
+    Dict[str, Any],
+    List[Union[bigquery.ScalarQueryParameter, bigquery.ArrayQueryParameter]],
+]
+
+EXPORT_COMPRESSIONS = {
+    "CSV": ["GZIP"],
+    "JSON": ["GZIP"],
+    "PARQUET": ["SNAPPY", "GZIP", "ZSTD"],
+    "AVRO": ["SNAPPY", "DEFLATE"],
+}
+# Compression used by export_to_storage when none is given
+EXPORT_DEFAULT_COMPRESSIONS = {"PARQUET": "SNAPPY", "AVRO": "SNAPPY"}
+WATERMARK_PATTERN = re.compile(r"@watermark\b")
+
+_query_cache: Optional[ParquetCache] = None
+_table_cache = TTLCache(ttl=300)
+_maximum_bytes_billed: Optional[int] = (
+    int(os.environ["BQ_MAXIMUM_BYTES_BILLED"])
+    if os.getenv("BQ_MAXIMUM_BYTES_BILLED")
+    else None
+)
 
 
 def _client() -> bigquery.Client:
@@ -21,119 +82,936 @@ def _client() -> bigquery.Client:
     return bigquery.Client(project, credentials)
 
 
-def write_to_table(data: list[dict], table: str) -> None:
-    """Upload data to a table in BigQuery
+def _split_rows(
+    data: List[dict],
+    row_ids: Optional[List[str]],
+    max_rows: int,
+    max_bytes: int,
+) -> Generator[Tuple[int, List[dict], List[str]], None, None]:
+    """Splits rows into chunks which respect both a row count and a payload size limit.
+    Rows without insert ids get a random one, generated once so that retries of a chunk
+    reuse it and BigQuery can dedupe rows which landed before a failed response
+
+    Args:
+        data (List[dict]): The rows to split
+        row_ids (Optional[List[str]]): Insert ids matching each row, if any
+        max_rows (int): The maximum amount of rows per chunk
+        max_bytes (int): The maximum approximate JSON payload size per chunk
+
+    Yields:
+        Generator[Tuple[int, List[dict], List[str]], None, None]: The offset of the
+        chunk within data, the rows and their insert ids
+    """
+
+    def chunk(start: int, end: int) -> Tuple[int, List[dict], List[str]]:
+        if row_ids:
+            ids = row_ids[start:end]
+        else:
+            ids = [str(uuid.uuid4()) for _ in range(end - start)]
+        return start, data[start:end], ids
+
+    start, size = 0, 0
+    for i, row in enumerate(data):
+        row_size = len(json.dumps(row, default=str)) + 1
+        if i > start and (i - start >= max_rows or size + row_size > max_bytes):
+            yield chunk(start, i)
+            start, size = i, 0
+        size += row_size
+    if start < len(data):
+        yield chunk(start, len(data))
+
+
+def _insert_chunk(
+    client: bigquery.Client,
+    table: str,
+    rows: List[dict],
+    row_ids: List[str],
+    max_retries: int,
+) -> List[dict]:
+    """Streams a chunk of rows into a table, retrying only the rows which failed
+    with a retryable reason
+
+    Args:
+        client (bigquery.Client): The client to insert with
+        table (str): The table to append
+        rows (List[dict]): The rows to insert
+        row_ids (List[str]): Insert ids used by BigQuery for best effort dedupe, reused
+            when rows are retried
+        max_retries (int): How many times failed rows are retried
+
+    Returns:
+        List[dict]: Insert errors for rows which could not be inserted, indexed by
+        their position in rows
+    """
+    indexes = list(range(len(rows)))
+    failed = []
+    for attempt in range(max_retries + 1):
+        errors = client.insert_rows_json(
+            table=table,
+            json_rows=rows,
+            row_ids=row_ids,
+        )
+        retry = []
+        for error in errors:
+            error = {**error, "index": indexes[error["index"]]}
+            reasons = {e.get("reason") for e in error.get("errors", [])}
+            if reasons and reasons <= RETRYABLE_INSERT_REASONS:
+                retry.append(error)
+            else:
+                failed.append(error)
+        if not retry:
+            break
+        if attempt == max_retries:
+            failed.extend(retry)
+            break
+        logger.debug(f"Retrying {len(retry)} row(s) in {table}")
+        positions = {index: i for i, index in enumerate(indexes)}
+        keep = [positions[error["index"]] for error in retry]
+        indexes = [indexes[i] for i in keep]
+        rows = [rows[i] for i in keep]
+        row_ids = [row_ids[i] for i in keep]
+        time.sleep(2**attempt)
+    return failed
+
+
+def _estimate_size(data: List[dict], sample_size: int = 1000) -> int:
+    """Estimates the JSON payload size of a list of rows from a sample of them
+
+    Args:
+        data (List[dict]): The rows to estimate the size of
+        sample_size (int, optional): How many rows to serialize. Defaults to 1000.
+
+    Returns:
+        int: The estimated size in bytes
+    """
+    sample = data[:sample_size]
+    if not sample:
+        return 0
+    sample_bytes = sum(len(json.dumps(row, default=str)) + 1 for row in sample)
+    return sample_bytes * len(data) // len(sample)
+
+
+def _load_job_config(
+    source_format: str, write_disposition: str
+) -> bigquery.LoadJobConfig:
+    return bigquery.LoadJobConfig(
+        source_format=source_format, write_disposition=write_disposition
+    )
+
+
+def _wait_for_load(job: bigquery.LoadJob, table: str) -> None:
+    """Waits for a load job to finish
+
+    Args:
+        job (bigquery.LoadJob): The job to wait for
+        table (str): The destination table
+
+    Raises:
+        RuntimeError: Raised when the load job fails
+    """
+    try:
+        job.result()
+    except Exception as e:
+        logger.error(job.errors)
+        raise RuntimeError(
+            f"Someting went wrong trying to load data into {table} in big query"
+        ) from e
+    logger.info(f"Loaded {job.output_rows} row(s) into {table}")
+
+
+def load_to_table(
+    data: List[dict], table: str, write_disposition: str = "WRITE_APPEND"
+) -> None:
+    """Upload data to a table in BigQuery with a load job from an in-memory
+    new line delimited JSON buffer. Load jobs are free and much faster than
+    streaming inserts for large batches
+
+    Args:
+        data (List[dict]): The data to upload
+        table (str): The table to load into
+        write_disposition (str, optional): The BigQuery write disposition. Defaults to "WRITE_APPEND".
+
+    Raises:
+        RuntimeError: Raised when the load job fails
+    """
+    logger.info(f"Loading {len(data)} row(s) into {table}")
+    buffer = BytesIO()
+    for row in data:
+        buffer.write(json.dumps(row, default=str).encode("utf-8"))
+        buffer.write(b"\n")
+    buffer.seek(0)
+    job = _client().load_table_from_file(
+        buffer,
+        table,
+        job_config=_load_job_config(
+            bigquery.SourceFormat.NEWLINE_DELIMITED_JSON, write_disposition
+        ),
+    )
+    _wait_for_load(job, table)
+
+
+def write_df_to_table(
+    df: pd.DataFrame, table: str, write_disposition: str = "WRITE_APPEND"
+) -> None:
+    """Upload a Pandas DataFrame to a table in BigQuery with a load job. The
+    DataFrame is serialized to an in-memory Parquet buffer, which keeps column types
+
+    Args:
+        df (pd.DataFrame): The DataFrame to upload
+        table (str): The table to load into
+        write_disposition (str, optional): The BigQuery write disposition. Defaults to "WRITE_APPEND".
+
+    Raises:
+        RuntimeError: Raised when the load job fails
+    """
+    logger.info(f"Loading {len(df)} row(s) into {table}")
+    if df.empty:
+        logger.info("No new data to insert")
+        return
+    job = _client().load_table_from_dataframe(
+        df,
+        table,
+        job_config=_load_job_config(bigquery.SourceFormat.PARQUET, write_disposition),
+    )
+    _wait_for_load(job, table)
+
+
+def write_to_table(
+    data: List[dict],
+    table: str,
+    row_ids: Optional[List[str]] = None,
+    max_rows_per_request: int = MAX_INSERT_ROWS,
+    max_bytes_per_request: int = MAX_INSERT_BYTES,
+    max_workers: int = 8,
+    max_retries: int = 3,
+    method: str = "auto",
+) -> None:
+    """Upload data to a table in BigQuery. Streaming inserts split rows into requests
+    which respect the streaming API size limits and send them concurrently, while
+    large payloads are written with a single load job instead
 
     Args:
         data (List[dict]): The data to upload
         table (str): The table to append
+        row_ids (List[str], optional): Insert ids for each row, used by BigQuery to dedupe
+            retried rows. Defaults to a random id per row.
+        max_rows_per_request (int, optional): The maximum amount of rows per request. Defaults to 10000.
+        max_bytes_per_request (int, optional): The maximum payload size per request. Defaults to 9MB.
+        max_workers (int, optional): How many requests to send concurrently. Defaults to 8.
+        max_retries (int, optional): How many times rows failing with a retryable reason are retried. Defaults to 3.
+        method (str, optional): "streaming", "load" or "auto", which uses a load job when the
+            payload is larger than 64MB and no row_ids are given. Defaults to "auto".
 
     Raises:
+        ValueError: Raised when row_ids does not match the length of data or the method is invalid
         RuntimeError: Raised when the table is not appended properly
     """
     logger.info(f"Inserting {len(data)} row(s) into {table}")
-    if data:
-        errors = _client().insert_rows_json(table=table, json_rows=data)
-        if errors:
-            logger.error(errors)
-            raise RuntimeError(
-                "Someting went wrong trying to append the table in big query"
-            )
-        return
-    else:
+    if not data:
         logger.info("No new data to insert")
         return
+    if method not in WRITE_METHODS:
+        raise ValueError(f"Provided method must be one of {WRITE_METHODS}")
+    if row_ids is not None and len(row_ids) != len(data):
+        raise ValueError("row_ids must contain one id for each row in data")
+    if method == "auto" and row_ids is None:
+        method = (
+            "load" if _estimate_size(data) > BULK_LOAD_THRESHOLD_BYTES else "streaming"
+        )
+    if method == "load":
+        load_to_table(data, table)
+        return
+    client = _client()
+    errors = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                _insert_chunk, client, table, rows, ids, max_retries
+            ): offset
+            for offset, rows, ids in _split_rows(
+                data, row_ids, max_rows_per_request, max_bytes_per_request
+            )
+        }
+        logger.debug(f"Sending {len(futures)} insert request(s) to {table}")
+        for future in as_completed(futures):
+            offset = futures[future]
+            errors.extend(
+                {**error, "index": error["index"] + offset} for error in future.result()
+            )
+    if errors:
+        logger.error(errors)
+        raise RuntimeError(
+            f"Someting went wrong trying to append the table in big query: {len(errors)} row(s) failed"
+        )
+
+
+def set_maximum_bytes_billed(maximum_bytes_billed: Optional[int]) -> None:
+    """Sets the default maximum bytes billed for every query run by this module.
+    Queries which would process more bytes fail without being billed. Passing None
+    removes the limit. The default can also be set with the BQ_MAXIMUM_BYTES_BILLED
+    environment variable
+
+    Args:
+        maximum_bytes_billed (Optional[int]): The limit in bytes
+    """
+    global _maximum_bytes_billed
+    _maximum_bytes_billed = maximum_bytes_billed
+
+
+def _query_parameter(
+    name: str, value: Any
+) -> Union[bigquery.ScalarQueryParameter, bigquery.ArrayQueryParameter]:
+    """Creates a query parameter, inferring its BigQuery type from the Python value
+
+    Args:
+        name (str): The parameter name, referenced as @name in the query
+        value (Any): The parameter value
+
+    Raises:
+        TypeError: If the type of the value can't be mapped to a BigQuery type
+
+    Returns:
+        Union[bigquery.ScalarQueryParameter, bigquery.ArrayQueryParameter]: The query parameter
+    """
+    if isinstance(value, (list, tuple, set)):
+        values = list(value)
+        element_type = _query_parameter(name, values[0]).type_ if values else "STRING"
+        return bigquery.ArrayQueryParameter(name, element_type, values)
+    if value is None:
+        return bigquery.ScalarQueryParameter(name, "STRING", None)
+    for python_type, bigquery_type in PARAMETER_TYPES:
+        if isinstance(value, python_type):
+            if bigquery_type == "DATETIME" and value.tzinfo is not None:
+                bigquery_type = "TIMESTAMP"
+            return bigquery.ScalarQueryParameter(name, bigquery_type, value)
+    raise TypeError(f"Unsupported query parameter type for '{name}': {type(value)}")
+
+
+def _job_config(
+    params: Optional[QueryParams] = None,
+    maximum_bytes_billed: Optional[int] = None,
+    dry_run: bool = False,
+) -> bigquery.QueryJobConfig:
+    """Creates the job config for a query
+
+    Args:
+        params (QueryParams, optional): A dict of parameter names to values or a list of
+            bigquery query parameters. Defaults to None.
+        maximum_bytes_billed (int, optional): The limit for this query, falling back
+            to the module default. Defaults to None.
+        dry_run (bool, optional): Only validate the query and estimate its cost. Defaults to False.
+
+    Returns:
+        bigquery.QueryJobConfig: The job config
+    """
+    if isinstance(params, dict):
+        params = [_query_parameter(k, v) for k, v in params.items()]
+    return bigquery.QueryJobConfig(
+        query_parameters=params or [],
+        maximum_bytes_billed=maximum_bytes_billed or _maximum_bytes_billed,
+        dry_run=dry_run,
+        use_query_cache=not dry_run,
+    )
+
+
+def _run_query(
+    query: str,
+    params: Optional[QueryParams] = None,
+    maximum_bytes_billed: Optional[int] = None,
+) -> bigquery.QueryJob:
+    logger.debug(f"Running query: {query}")
+    return _client().query(
+        query,
+        job_config=_job_config(params, maximum_bytes_billed),
+    )
+
 
+def dry_run(query: str, params: Optional[QueryParams] = None) -> int:
+    """Validates a query without running it and returns how many bytes it would process
 
-def query(query: str) -> list[dict]:
+    Args:
+        query (str): The query to validate
+        params (QueryParams, optional): A dict of parameter names to values or a list of
+            bigquery query parameters. Defaults to None.
+
+    Returns:
+        int: The bytes the query would process
+
+    >>> dry_run("SELECT * FROM events WHERE day = @day", params={"day": datetime.date(2023, 1, 1)})
+    1048576
+    """
+    job = _client().query(query, job_config=_job_config(params, dry_run=True))
+    logger.debug(f"Query would process {job.total_bytes_processed} byte(s)")
+    return job.total_bytes_processed
+
+
+def query(
+    query: str,
+    params: Optional[QueryParams] = None,
+    maximum_bytes_billed: Optional[int] = None,
+) -> list[dict]:
     """Runs a query in Big Query and returns the results as a list of dictionaries
     Args:
         query (str): The query to run
+        params (QueryParams, optional): Parameters to bind to the query. Defaults to None.
+        maximum_bytes_billed (int, optional): Fail the query if it would bill more bytes. Defaults to None.
     Returns:
         list[dict]: The results
     """
-    result = [dict(row) for row in _client().query(query)]
+    result = [dict(row) for row in _run_query(query, params, maximum_bytes_billed)]
     logger.debug(f"Result: {len(result)} row(s).")
     return result
 
 
-def query_to_df(query: str) -> pd.DataFrame:
-    """Runs a query and returns the results as a Pandas DataFrame
+def set_query_cache(cache: Optional[ParquetCache]) -> None:
+    """Sets the cache used by query_to_df. Passing None disables caching
+
+    Args:
+        cache (Optional[ParquetCache]): The cache to store query results in
+
+    >>> set_query_cache(ParquetCache("/tmp/bq-cache", ttl=900))
+    """
+    global _query_cache
+    _query_cache = cache
+
+
+def normalize_query(query: str) -> str:
+    """Normalizes a query so that formatting differences don't change its cache key.
+    Whitespace outside of quoted strings and identifiers is collapsed and trailing
+    semicolons are removed
+
+    Args:
+        query (str): The query to normalize
+
+    Returns:
+        str: The normalized query
+    """
+    return (
+        QUERY_TOKEN_PATTERN.sub(lambda m: m.group() if m.group(1) else " ", query)
+        .strip()
+        .rstrip(";")
+        .strip()
+    )
+
+
+def _params_repr(params: Optional[QueryParams]) -> Any:
+    if params is None or isinstance(params, dict):
+        return params
+    return [p.to_api_repr() for p in params]
+
+
+def _cache_key(query: str, params: Any = None) -> str:
+    payload = json.dumps(
+        {"query": normalize_query(query), "params": params},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def query_to_df(
+    query: str,
+    params: Optional[QueryParams] = None,
+    maximum_bytes_billed: Optional[int] = None,
+    use_cache: bool = True,
+) -> pd.DataFrame:
+    """Runs a query and returns the results as a Pandas DataFrame. When a cache
+    has been set with set_query_cache, results are read from and stored in it
 
     Args:
         query (str): The query to run
+        params (QueryParams, optional): Parameters to bind to the query. Defaults to None.
+        maximum_bytes_billed (int, optional): Fail the query if it would bill more bytes. Defaults to None.
+        use_cache (bool, optional): Whether to use the query cache for this call. Defaults to True.
 
     Returns:
-        pd.DataFrame: _description_
+        pd.DataFrame: The results as a Pandas DataFrame
     """
-    logger.debug(f"Running query: {query}")
-    result = _client().query(query).result().to_dataframe()
+    cache = _query_cache if use_cache else None
+    if cache:
+        key = _cache_key(query, _params_repr(params))
+        if (result := cache.get(key)) is not None:
+            logger.debug(f"Result: {len(result)} row(s) from cache")
+            return result
+    result = _run_query(query, params, maximum_bytes_billed).result().to_dataframe()
     logger.debug(f"Result: {len(result)} row(s)")
+    if cache:
+        cache.set(key, result)
     return result
 
 
-def query_to_storage_df(query: str) -> pd.DataFrame:
-    """Runs a query and returns the results as a Pandas DataFrame using Google Cloud Storage
+@functools.lru_cache(maxsize=None)
+def _read_client() -> bigquery_storage.BigQueryReadClient:
+    """Returns a BigQueryReadClient which is shared between calls, since creating
+    one opens a new gRPC channel
+
+    Returns:
+        bigquery_storage.BigQueryReadClient: A BigQuery Storage read client
+    """
+    return bigquery_storage.BigQueryReadClient()
+
+
+def compact_dtypes(
+    df: pd.DataFrame, categorical_threshold: float = 0.5
+) -> pd.DataFrame:
+    """Converts the columns of a DataFrame to more memory efficient dtypes. Columns
+    holding only strings with few distinct values become categoricals and integer columns are
+    downcast to the smallest integer type which fits their values
+
+    Args:
+        df (pd.DataFrame): The DataFrame to convert
+        categorical_threshold (float, optional): The maximum ratio of distinct values to rows
+            for a string column to become a categorical. Defaults to 0.5.
+
+    Returns:
+        pd.DataFrame: The converted DataFrame
+    """
+    for column in df.columns:
+        series = df[column]
+        if series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+            # Columns of lists or dicts from REPEATED and STRUCT fields can't be counted
+            if pd.api.types.infer_dtype(series) != "string":
+                continue
+            distinct = series.nunique() / max(len(series), 1)
+            if distinct <= categorical_threshold:
+                df[column] = series.astype("category")
+        elif series.dtype.kind in "iu":
+            df[column] = pd.to_numeric(series, downcast="integer")
+    return df
+
+
+def query_to_storage_df(
+    query: str,
+    params: Optional[QueryParams] = None,
+    maximum_bytes_billed: Optional[int] = None,
+    as_arrow: bool = False,
+    dtypes: Optional[Dict[str, Any]] = None,
+    compact: bool = False,
+) -> Union[pd.DataFrame, pa.Table]:
+    """Runs a query and returns the results as a Pandas DataFrame using the BigQuery Storage API
 
     Args:
         query (str): The query to run
+        params (QueryParams, optional): Parameters to bind to the query. Defaults to None.
+        maximum_bytes_billed (int, optional): Fail the query if it would bill more bytes. Defaults to None.
+        as_arrow (bool, optional): Return a pyarrow.Table instead of a DataFrame, which skips
+            the conversion to pandas entirely. Defaults to False.
+        dtypes (Dict[str, Any], optional): Dtypes to use for specific columns. Defaults to None.
+        compact (bool, optional): Convert columns with compact_dtypes. Defaults to False.
 
     Returns:
-        pd.DataFrame: The results as a Pandas DataFrame
+        Union[pd.DataFrame, pa.Table]: The results as a Pandas DataFrame or a pyarrow.Table
     """
-    logger.debug(f"Running query: {query}")
-    storage_client = bigquery_storage.BigQueryReadClient()
-    result = (
-        _client().query(query).result().to_dataframe(bqstorage_client=storage_client)
-    )
+    rows = _run_query(query, params, maximum_bytes_billed).result()
+    if as_arrow:
+        result = rows.to_arrow(bqstorage_client=_read_client())
+    else:
+        result = rows.to_dataframe(bqstorage_client=_read_client(), dtypes=dtypes)
+        if compact:
+            result = compact_dtypes(result)
     logger.debug(f"Result: {len(result)} row(s)")
     return result
 
 
-def query_to_storage(
-    query: str, output_path: str, fmt="CSV"
-) -> Union[RowIterator, _EmptyRowIterator]:
-    """Runs a query and exports the results to Google Cloud Storage as a CSV or NL JSON file
+def iter_query(
+    query: str,
+    params: Optional[QueryParams] = None,
+    maximum_bytes_billed: Optional[int] = None,
+    as_arrow: bool = False,
+    dtypes: Optional[Dict[str, Any]] = None,
+    compact: bool = False,
+) -> Generator[Union[pd.DataFrame, pa.RecordBatch], None, None]:
+    """Runs a query and yields the results in chunks using the BigQuery Storage API,
+    so results larger than memory can be processed one chunk at a time
 
     Args:
         query (str): The query to run
-        output_path (str): The path to output the results to on GCS
-        fmt (str, optional): The format to output the results as. Defaults to "CSV".
+        params (QueryParams, optional): Parameters to bind to the query. Defaults to None.
+        maximum_bytes_billed (int, optional): Fail the query if it would bill more bytes. Defaults to None.
+        as_arrow (bool, optional): Yield pyarrow.RecordBatch objects instead of DataFrames. Defaults to False.
+        dtypes (Dict[str, Any], optional): Dtypes to use for specific columns. Defaults to None.
+        compact (bool, optional): Convert each chunk with compact_dtypes. Categories
+            are computed per chunk. Defaults to False.
+
+    Yields:
+        Generator[Union[pd.DataFrame, pa.RecordBatch], None, None]: Chunks of the results
+    """
+    rows = _run_query(query, params, maximum_bytes_billed).result()
+    logger.debug(f"Result: {rows.total_rows} row(s)")
+    if as_arrow:
+        yield from rows.to_arrow_iterable(bqstorage_client=_read_client())
+        return
+    for chunk in rows.to_dataframe_iterable(
+        bqstorage_client=_read_client(), dtypes=dtypes
+    ):
+        yield compact_dtypes(chunk) if compact else chunk
+
+
+class QueryResult(BaseModel):
+    """The result of one query run by run_queries
+
+    Args:
+        name (str): The name the query was submitted with
+        job_id (str): The BigQuery job id
+        df (pd.DataFrame): The results, or None when the query failed
+        seconds (float): Seconds BigQuery spent running the query, from the job's start and end times
+        fetch_seconds (float): Seconds spent downloading the results
+        bytes_processed (int): Bytes processed by the query
+        bytes_billed (int): Bytes billed for the query
+        error (str): The error message when the query failed
+    """
+
+    name: str
+    job_id: Optional[str]
+    df: Optional[pd.DataFrame]
+    seconds: Optional[float]
+    fetch_seconds: Optional[float]
+    bytes_processed: Optional[int]
+    bytes_billed: Optional[int]
+    error: Optional[str]
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+def _fetch_result(name: str, job: bigquery.QueryJob, use_storage: bool) -> QueryResult:
+    fetch_seconds = None
+    try:
+        rows = job.result()
+        fetch_started = time.perf_counter()
+        df = rows.to_dataframe(bqstorage_client=_read_client() if use_storage else None)
+        fetch_seconds = time.perf_counter() - fetch_started
+        error = None
+    except Exception as e:
+        logger.error(f"Query {name} failed: {e}")
+        df, error = None, str(e)
+    seconds = None
+    if job.started and job.ended:
+        seconds = (job.ended - job.started).total_seconds()
+    return QueryResult(
+        name=name,
+        job_id=job.job_id,
+        df=df,
+        seconds=seconds,
+        fetch_seconds=fetch_seconds,
+        bytes_processed=job.total_bytes_processed,
+        bytes_billed=job.total_bytes_billed,
+        error=error,
+    )
+
+
+def run_queries(
+    queries: Dict[str, str],
+    params: Optional[Dict[str, QueryParams]] = None,
+    maximum_bytes_billed: Optional[int] = None,
+    max_workers: int = 8,
+    use_storage: bool = False,
+) -> Generator[QueryResult, None, None]:
+    """Submits many queries at once and yields their results as they complete, so the
+    total wall time is close to that of the slowest query rather than the sum of all
+    of them. A failing query doesn't stop the others; its result has an error instead
+
+    Args:
+        queries (Dict[str, str]): Queries to run keyed by a name
+        params (Dict[str, QueryParams], optional): Parameters for each query keyed by its name. Defaults to None.
+        maximum_bytes_billed (int, optional): Fail any query which would bill more bytes. Defaults to None.
+        max_workers (int, optional): How many results to fetch concurrently. Defaults to 8.
+        use_storage (bool, optional): Fetch results with the BigQuery Storage API. Defaults to False.
+
+    Yields:
+        Generator[QueryResult, None, None]: The result of each query in the order they complete
+
+    >>> for result in run_queries({"orders": "SELECT ...", "drivers": "SELECT ..."}):
+    ...     print(result.name, result.seconds, result.bytes_processed)
+    """
+    params = params or {}
+    client = _client()
+    jobs = {}
+    for name, sql in queries.items():
+        logger.debug(f"Submitting query {name}: {sql}")
+        jobs[name] = client.query(
+            sql,
+            job_config=_job_config(params.get(name), maximum_bytes_billed),
+        )
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_fetch_result, name, job, use_storage)
+            for name, job in jobs.items()
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            logger.debug(
+                f"Query {result.name} ran for {result.seconds}s, "
+                f"{result.bytes_processed} byte(s) processed"
+            )
+            yield result
+
+
+def _export_statement(
+    query: str,
+    output_path: str,
+    fmt: str,
+    compression: Optional[str],
+    order_by: Optional[str],
+    header: bool,
+    field_delimiter: str,
+    overwrite: bool,
+) -> str:
+    """Builds an EXPORT DATA statement for a query
 
     Raises:
-        ValueError: If the export format is not supported
+        ValueError: If the export format or compression is not supported
 
     Returns:
-        Union[RowIterator, _EmptyRowIterator]: Results from the BQ API
+        str: The statement
     """
-    logger.debug(f"Running query: {query}")
+    fmt = fmt.upper()
+    if fmt not in EXPORT_COMPRESSIONS:
+        raise ValueError("Invalid Big Query export format")
+    options = [
+        f"uri='{output_path}'",
+        f"format='{fmt}'",
+        f"overwrite={str(overwrite).lower()}",
+    ]
+    if compression:
+        if compression.upper() not in EXPORT_COMPRESSIONS[fmt]:
+            raise ValueError(
+                f"Compression for {fmt} must be one of {EXPORT_COMPRESSIONS[fmt]}"
+            )
+        options.append(f"compression='{compression.upper()}'")
     if fmt == "CSV":
-        query_job = _client().query(
-            f"""
-            EXPORT DATA OPTIONS(
-            uri='{output_path}',
-            format='CSV',
-            overwrite=true,
-            header=true,
-            field_delimiter=';') AS
-            {query}
-            ORDER BY 1
-            """
+        options.extend(
+            [f"header={str(header).lower()}", f"field_delimiter='{field_delimiter}'"]
         )
-    elif fmt == "JSON":
-        query_job = _client().query(
-            f"""
+    order = f"ORDER BY {order_by}" if order_by else ""
+    return f"""
             EXPORT DATA OPTIONS(
-            uri='{output_path}',
-            format='JSON',
-            overwrite=true) AS
+            {", ".join(options)}) AS
             {query}
-            ORDER BY 1
+            {order}
             """
+
+
+def _run_export(
+    query: str,
+    output_path: str,
+    fmt: str,
+    params: Optional[QueryParams],
+    maximum_bytes_billed: Optional[int],
+    compression: Optional[str],
+    order_by: Optional[str],
+    header: bool,
+    field_delimiter: str,
+    overwrite: bool,
+) -> bigquery.QueryJob:
+    return _run_query(
+        _export_statement(
+            query,
+            output_path,
+            fmt,
+            compression,
+            order_by,
+            header,
+            field_delimiter,
+            overwrite,
+        ),
+        params,
+        maximum_bytes_billed,
+    )
+
+
+def query_to_storage(
+    query: str,
+    output_path: str,
+    fmt="CSV",
+    params: Optional[QueryParams] = None,
+    maximum_bytes_billed: Optional[int] = None,
+    compression: Optional[str] = None,
+    order_by: Optional[str] = "1",
+    header: bool = True,
+    field_delimiter: str = ";",
+    overwrite: bool = True,
+) -> Union[RowIterator, _EmptyRowIterator]:
+    """Runs a query and exports the results to Google Cloud Storage as CSV, NL JSON, Parquet or Avro files
+
+    Args:
+        query (str): The query to run
+        output_path (str): The path to output the results to on GCS, including a single '*'
+            wildcard which BigQuery replaces with the shard number
+        fmt (str, optional): The format to output the results as (CSV, JSON, PARQUET or AVRO). Defaults to "CSV".
+        params (QueryParams, optional): Parameters to bind to the query. Defaults to None.
+        maximum_bytes_billed (int, optional): Fail the query if it would bill more bytes. Defaults to None.
+        compression (str, optional): The compression to use, ie GZIP, SNAPPY, ZSTD or DEFLATE
+            depending on the format. Defaults to None.
+        order_by (str, optional): An ORDER BY expression for the export. Ordering forces
+            a global sort; pass None to let BigQuery write shards in parallel. Defaults to "1".
+        header (bool, optional): Whether CSV files include a header. Defaults to True.
+        field_delimiter (str, optional): The CSV field delimiter. Defaults to ";".
+        overwrite (bool, optional): Whether to overwrite existing files. Defaults to True.
+
+    Raises:
+        ValueError: If the export format or compression is not supported
+
+    Returns:
+        Union[RowIterator, _EmptyRowIterator]: Results from the BQ API
+    """
+    return _run_export(
+        query,
+        output_path,
+        fmt,
+        params,
+        maximum_bytes_billed,
+        compression,
+        order_by,
+        header,
+        field_delimiter,
+        overwrite,
+    ).result()
+
+
+class ExportObject(BaseModel):
+    """An object written by an export
+
+    Args:
+        uri (str): The gs:// uri of the object
+        size (int): The size of the object in bytes
+    """
+
+    uri: str
+    size: int
+
+
+class ExportManifest(BaseModel):
+    """A description of the objects produced by export_to_storage
+
+    Args:
+        job_id (str): The BigQuery job id of the export
+        output_path (str): The wildcard uri which was exported to
+        fmt (str): The export format
+        compression (str): The export compression
+        file_count (int): The amount of files BigQuery reported writing
+        row_count (int): The amount of rows BigQuery reported writing across all files
+        objects (List[ExportObject]): The objects matching the output path which were written by the export
+    """
+
+    job_id: str
+    output_path: str
+    fmt: str
+    compression: Optional[str]
+    file_count: Optional[int]
+    row_count: Optional[int]
+    objects: List[ExportObject]
+
+
+def _list_export_objects(
+    output_path: str, created_since: Optional[datetime.datetime]
+) -> List[ExportObject]:
+    """Lists the objects matching an export's wildcard uri which were created by the
+    export. An earlier export to the same path may have left more shards behind, since
+    overwriting only replaces objects with the same names
+
+    Args:
+        output_path (str): The wildcard uri which was exported to
+        created_since (Optional[datetime.datetime]): When the export job started
+
+    Returns:
+        List[ExportObject]: The objects written by the export
+    """
+    bucket_name, pattern = output_path[len("gs://") :].split("/", 1)
+    prefix = pattern.split("*", 1)[0]
+    return [
+        ExportObject(uri=f"gs://{bucket_name}/{blob.name}", size=blob.size)
+        for blob in storage.Client().list_blobs(
+            bucket_name,
+            prefix=prefix,
+            fields="items(name,size,timeCreated),nextPageToken",
         )
-    else:
-        raise ValueError("Invalid Big Query export format")
-    return query_job.result()
+        if fnmatch.fnmatchcase(blob.name, pattern)
+        and (created_since is None or blob.time_created >= created_since)
+    ]
+
+
+def export_to_storage(
+    query: str,
+    output_path: str,
+    fmt: str = "PARQUET",
+    compression: Optional[str] = None,
+    params: Optional[QueryParams] = None,
+    maximum_bytes_billed: Optional[int] = None,
+    order_by: Optional[str] = None,
+    header: bool = True,
+    field_delimiter: str = ",",
+) -> ExportManifest:
+    """Runs a query, exports the results to Google Cloud Storage as sharded files and
+    returns a manifest of the objects produced. Results aren't ordered by default, so
+    BigQuery writes every shard in parallel and readers can fan out per object
+
+    Args:
+        query (str): The query to run
+        output_path (str): The gs:// path to output the results to, including a single '*'
+            wildcard which BigQuery replaces with the shard number
+        fmt (str, optional): The format to output the results as (CSV, JSON, PARQUET or AVRO). Defaults to "PARQUET".
+        compression (str, optional): The compression to use. Defaults to SNAPPY for PARQUET
+            and AVRO, and no compression for CSV and JSON.
+        params (QueryParams, optional): Parameters to bind to the query. Defaults to None.
+        maximum_bytes_billed (int, optional): Fail the query if it would bill more bytes. Defaults to None.
+        order_by (str, optional): An ORDER BY expression for the export. Defaults to None.
+        header (bool, optional): Whether CSV files include a header. Defaults to True.
+        field_delimiter (str, optional): The CSV field delimiter. Defaults to ",".
+
+    Raises:
+        ValueError: If the output path is not a gs:// uri with a wildcard, or the format or
+            compression is not supported
+
+    Returns:
+        ExportManifest: The objects which were written and the amount of rows exported
+
+    >>> manifest = export_to_storage("SELECT * FROM events", "gs://bucket/events/part-*.parquet")
+    >>> [o.uri for o in manifest.objects]
+    ['gs://bucket/events/part-000000000000.parquet', 'gs://bucket/events/part-000000000001.parquet']
+    """
+    if not output_path.startswith("gs://") or output_path.count("*") != 1:
+        raise ValueError(
+            "output_path must be a gs:// uri containing a single '*' wildcard"
+        )
+    if compression is None:
+        compression = EXPORT_DEFAULT_COMPRESSIONS.get(fmt.upper())
+    job = _run_export(
+        query,
+        output_path,
+        fmt,
+        params,
+        maximum_bytes_billed,
+        compression,
+        order_by,
+        header,
+        field_delimiter,
+        True,
+    )
+    job.result()
+    statistics = (
+        job._properties.get("statistics", {})
+        .get("query", {})
+        .get("exportDataStatistics", {})
+    )
+    manifest = ExportManifest(
+        job_id=job.job_id,
+        output_path=output_path,
+        fmt=fmt.upper(),
+        compression=compression.upper() if compression else None,
+        file_count=statistics.get("fileCount"),
+        row_count=statistics.get("rowCount"),
+        objects=_list_export_objects(output_path, job.started),
+    )
+    if manifest.file_count is not None and len(manifest.objects) != manifest.file_count:
+        logger.warning(
+            f"BigQuery reported writing {manifest.file_count} file(s) to {output_path} "
+            f"but {len(manifest.objects)} object(s) were found"
+        )
+    logger.info(
+        f"Exported {manifest.row_count} row(s) to {len(manifest.objects)} object(s) at {output_path}"
+    )
+    return manifest
 
 
 def get_table_info(project, dataset, table):
@@ -147,3 +1025,332 @@ def get_table_info(project, dataset, table):
         view = None
 
     return view
+
+
+class TableInfo(BaseModel):
+    """A summary of a BigQuery table's metadata
+
+    Args:
+        table_id (str): The full table id, ie project.dataset.table
+        table_type (str): TABLE, VIEW, EXTERNAL etc.
+        schema (List[Dict[str, Any]]): The table schema in its API representation
+        num_rows (int): The amount of rows in the table
+        num_bytes (int): The size of the table in bytes
+        partitioning (Dict[str, Any]): The time or range partitioning of the table
+        clustering_fields (List[str]): The fields the table is clustered by
+        modified (datetime.datetime): When the table was last modified
+        error (str): The error message when the table could not be described
+    """
+
+    table_id: str
+    table_type: Optional[str]
+    schema_: List[Dict[str, Any]] = Field([], alias="schema")
+    num_rows: Optional[int]
+    num_bytes: Optional[int]
+    partitioning: Optional[Dict[str, Any]]
+    clustering_fields: Optional[List[str]]
+    modified: Optional[datetime.datetime]
+    error: Optional[str]
+
+    class Config:
+        allow_population_by_field_name = True
+
+    @classmethod
+    def from_table(cls, table_id: str, table: bigquery.Table) -> "TableInfo":
+        if table.time_partitioning:
+            partitioning = table.time_partitioning.to_api_repr()
+        elif table.range_partitioning:
+            partitioning = table.range_partitioning._properties
+        else:
+            partitioning = None
+        return cls(
+            table_id=table_id,
+            table_type=table.table_type,
+            schema=[field.to_api_repr() for field in table.schema],
+            num_rows=table.num_rows,
+            num_bytes=table.num_bytes,
+            partitioning=partitioning,
+            clustering_fields=table.clustering_fields,
+            modified=table.modified,
+        )
+
+
+def _describe_table(client: bigquery.Client, table_id: str) -> TableInfo:
+    try:
+        return TableInfo.from_table(table_id, client.get_table(table_id))
+    except Exception as e:
+        logger.info(f"Cannot get table info for {table_id}: {e}")
+        return TableInfo(table_id=table_id, error=str(e))
+
+
+def describe_tables(
+    tables: List[str], max_workers: int = 16, use_cache: bool = True
+) -> Dict[str, TableInfo]:
+    """Fetches the schema, size and partitioning of many tables concurrently. Results
+    are cached for 5 minutes; tables which could not be described have an error
+    set and are not cached
+
+    Args:
+        tables (List[str]): Full table ids, ie project.dataset.table
+        max_workers (int, optional): How many tables to fetch concurrently. Defaults to 16.
+        use_cache (bool, optional): Whether to read from the metadata cache. Defaults to True.
+
+    Returns:
+        Dict[str, TableInfo]: Table metadata keyed by table id
+
+    >>> info = describe_tables(["project.dataset.orders", "project.dataset.drivers"])
+    >>> info["project.dataset.orders"].num_rows
+    1000
+    """
+    results = {}
+    missing = []
+    for table_id in tables:
+        cached = _table_cache.get(table_id) if use_cache else None
+        if cached:
+            results[table_id] = cached
+        else:
+            missing.append(table_id)
+    logger.debug(f"Describing {len(missing)} table(s), {len(results)} cached table(s)")
+    if missing:
+        client = _client()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for info in executor.map(
+                lambda table_id: _describe_table(client, table_id), missing
+            ):
+                if not info.error:
+                    _table_cache.set(info.table_id, info)
+                results[info.table_id] = info
+    return {table_id: results[table_id] for table_id in tables}
+
+
+class StateStore(ABC):
+    """Stores the watermark of incremental queries between runs"""
+
+    @abstractmethod
+    def read(self) -> Dict[str, Any]:
+        """Reads the whole state
+
+        Returns:
+            Dict[str, Any]: Encoded watermarks keyed by state key, empty if nothing was stored yet
+        """
+
+    @abstractmethod
+    def write(self, state: Dict[str, Any]) -> None:
+        """Replaces the whole state
+
+        Args:
+            state (Dict[str, Any]): Encoded watermarks keyed by state key, which are JSON serializable
+        """
+
+    def get(self, key: str) -> Any:
+        """Returns the watermark stored for a key
+
+        Args:
+            key (str): The state key
+
+        Returns:
+            Any: The watermark or None if there isn't one
+        """
+        entry = self.read().get(key)
+        return _decode_watermark(entry) if entry else None
+
+    def set(self, key: str, value: Any) -> None:
+        """Stores the watermark for a key
+
+        Args:
+            key (str): The state key
+            value (Any): The watermark
+        """
+        state = self.read()
+        state[key] = _encode_watermark(value)
+        self.write(state)
+
+
+class LocalStateStore(StateStore):
+    """Stores incremental query state in a local JSON file"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def read(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r") as f:
+            return json.load(f)
+
+    def write(self, state: Dict[str, Any]) -> None:
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.path)
+
+
+class StorageStateStore(StateStore):
+    """Stores incremental query state in a JSON object on Google Cloud Storage,
+    which suits Cloud Functions and other services without a persistent disk
+    """
+
+    def __init__(self, bucket_name: str, path: str) -> None:
+        self.bucket_name = bucket_name
+        self.path = path
+
+    def _blob(self) -> storage.Blob:
+        return storage.Client().bucket(self.bucket_name).blob(self.path)
+
+    def read(self) -> Dict[str, Any]:
+        blob = self._blob()
+        if not blob.exists():
+            return {}
+        return json.loads(blob.download_as_bytes())
+
+    def write(self, state: Dict[str, Any]) -> None:
+        self._blob().upload_from_string(
+            json.dumps(state), content_type="application/json"
+        )
+
+
+def _encode_watermark(value: Any) -> Dict[str, Any]:
+    if isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    elif hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, datetime.datetime):
+        return {"type": "datetime", "value": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"type": "date", "value": value.isoformat()}
+    if isinstance(value, Decimal):
+        # NUMERIC and BIGNUMERIC values would lose precision as a JSON number
+        return {"type": "decimal", "value": str(value)}
+    return {"type": "value", "value": value}
+
+
+def _decode_watermark(entry: Dict[str, Any]) -> Any:
+    if entry["type"] == "datetime":
+        return datetime.datetime.fromisoformat(entry["value"])
+    if entry["type"] == "date":
+        return datetime.date.fromisoformat(entry["value"])
+    if entry["type"] == "decimal":
+        return Decimal(entry["value"])
+    return entry["value"]
+
+
+def _incremental_params(
+    query: str,
+    state_key: str,
+    state_store: StateStore,
+    initial_watermark: Any,
+    params: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Returns the parameters of an incremental query, binding the stored watermark
+
+    Raises:
+        ValueError: If the query doesn't use the @watermark parameter
+
+    Returns:
+        Dict[str, Any]: The parameters
+    """
+    # BigQuery accepts unused parameters, so without this check the query would scan
+    # the whole table on every run while the watermark still advanced
+    if not WATERMARK_PATTERN.search(query):
+        raise ValueError("An incremental query must filter on the @watermark parameter")
+    watermark = state_store.get(state_key)
+    if watermark is None:
+        watermark = initial_watermark
+    logger.info(f"Querying {state_key} for rows after {watermark}")
+    return {**(params or {}), "watermark": watermark}
+
+
+def query_incremental(
+    query: str,
+    state_key: str,
+    watermark_column: str,
+    state_store: StateStore,
+    initial_watermark: Any,
+    params: Optional[Dict[str, Any]] = None,
+    maximum_bytes_billed: Optional[int] = None,
+) -> pd.DataFrame:
+    """Runs a query for rows added since its last run. The query must filter on
+    the @watermark parameter, ideally against the partitioning column, so that
+    BigQuery only scans new partitions. After the query runs, the maximum value of
+    watermark_column is stored as the watermark for the next run. Filter with a strict
+    `>`, so rows from the last run aren't returned again; this means rows which arrive
+    late with a value equal to the stored watermark are skipped
+
+    Args:
+        query (str): The query to run, filtering on @watermark
+        state_key (str): The key the watermark of this query is stored under
+        watermark_column (str): The result column to take the next watermark from
+        state_store (StateStore): Where watermarks are stored between runs
+        initial_watermark (Any): The watermark to use on the first run
+        params (Dict[str, Any], optional): Other parameters to bind to the query. Defaults to None.
+        maximum_bytes_billed (int, optional): Fail the query if it would bill more bytes. Defaults to None.
+
+    Raises:
+        ValueError: If the query doesn't use the @watermark parameter
+
+    Returns:
+        pd.DataFrame: The new rows
+
+    >>> query_incremental(
+    ...     "SELECT * FROM dataset.events WHERE event_time > @watermark",
+    ...     state_key="events",
+    ...     watermark_column="event_time",
+    ...     state_store=LocalStateStore("state.json"),
+    ...     initial_watermark=datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc),
+    ... )
+    """
+    df = query_to_df(
+        query,
+        params=_incremental_params(
+            query, state_key, state_store, initial_watermark, params
+        ),
+        maximum_bytes_billed=maximum_bytes_billed,
+        use_cache=False,
+    )
+    if not df.empty:
+        state_store.set(state_key, df[watermark_column].max())
+    return df
+
+
+def iter_query_incremental(
+    query: str,
+    state_key: str,
+    watermark_column: str,
+    state_store: StateStore,
+    initial_watermark: Any,
+    params: Optional[Dict[str, Any]] = None,
+    maximum_bytes_billed: Optional[int] = None,
+) -> Generator[pd.DataFrame, None, None]:
+    """Like query_incremental, but yields the new rows in chunks with iter_query. The
+    watermark is only stored once every chunk has been consumed, so a run which fails
+    part way is repeated in full next time
+
+    Args:
+        query (str): The query to run, filtering on @watermark
+        state_key (str): The key the watermark of this query is stored under
+        watermark_column (str): The result column to take the next watermark from
+        state_store (StateStore): Where watermarks are stored between runs
+        initial_watermark (Any): The watermark to use on the first run
+        params (Dict[str, Any], optional): Other parameters to bind to the query. Defaults to None.
+        maximum_bytes_billed (int, optional): Fail the query if it would bill more bytes. Defaults to None.
+
+    Raises:
+        ValueError: If the query doesn't use the @watermark parameter
+
+    Yields:
+        Generator[pd.DataFrame, None, None]: Chunks of the new rows
+    """
+    watermark = None
+    for chunk in iter_query(
+        query,
+        params=_incremental_params(
+            query, state_key, state_store, initial_watermark, params
+        ),
+        maximum_bytes_billed=maximum_bytes_billed,
+    ):
+        if not chunk.empty:
+            chunk_max = chunk[watermark_column].max()
+            watermark = chunk_max if watermark is None else max(watermark, chunk_max)
+        yield chunk
+    if watermark is not None:
+        state_store.set(state_key, watermark)
@@ -1,78 +1,243 @@
 from io import BytesIO
 
 import google.auth
-from typing import Dict, List
+import mimetypes
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, Union
 from googleapiclient.discovery import build, Resource
 from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
 import io
+from ggvlib.cache import TTLCache
+from ggvlib.google.transfer import TransferResult, transfer_many
 from ggvlib.logging import logger
 
+FOLDER_MIMETYPE = "application/vnd.google-apps.folder"
+# The largest page files.list returns
+MAX_PAGE_SIZE = 1000
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Retries failed chunks with exponential backoff
+NUM_RETRIES = 5
+
+_local = threading.local()
+_item_cache = TTLCache(ttl=300)
+
 
 def _service() -> Resource:
-    """Create and return a Google Drive API service
+    """Returns a Google Drive API service, built once per thread. Building the
+    service is slow, and services can't be shared between threads since httplib2
+    isn't thread safe
 
     Returns:
         Resource: A google drive service
     """
-    creds, _ = google.auth.default()
-    return build(
-        "drive",
-        "v3",
-        credentials=creds,
-    )
+    if getattr(_local, "service", None) is None:
+        creds, _ = google.auth.default()
+        _local.service = build(
+            "drive",
+            "v3",
+            credentials=creds,
+            cache_discovery=False,
+        )
+    return _local.service
 
 
 def get_service() -> Resource:
     return _service()
 
 
+def _list_folder(
+    folder_id: str,
+    page_size: int,
+    fields: str,
+    drive_id: str = None,
+) -> Iterator[Dict[str, str]]:
+    """Lists the items directly inside a folder, following every page of results
+
+    Args:
+        folder_id (str): The folder to list
+        page_size (int): How many items to request per page
+        fields (str): The file fields to return
+        drive_id (str, optional): The shared drive to search. Defaults to None.
+
+    Yields:
+        Iterator[Dict[str, str]]: The items in the folder
+    """
+    kwargs = {
+        "q": f'"{folder_id}" in parents',
+        "pageSize": min(page_size, MAX_PAGE_SIZE),
+        "fields": f"nextPageToken, files({fields})",
+        "supportsAllDrives": True,
+        "includeItemsFromAllDrives": True,
+    }
+    if drive_id:
+        kwargs.update(corpora="drive", driveId=drive_id)
+    page_token = None
+    while True:
+        response = _service().files().list(pageToken=page_token, **kwargs).execute()
+        yield from response.get("files", [])
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            break
+
+
 def list_files_in_directory(
-    drive_folder_id: str, page_size: int = 1000
-) -> List[Dict[str, str]]:
-    return (
-        _service()
-        .files()
-        .list(
-            q=f'"{drive_folder_id}" in parents',
-            pageSize=page_size,
-            fields="nextPageToken, files(id, name)",
-        )
-        .execute()
-        .get("files", [])
-    )
+    drive_folder_id: str,
+    page_size: int = 1000,
+    fields: str = "id, name",
+    recursive: bool = False,
+    drive_id: str = None,
+    max_workers: int = 8,
+) -> Iterator[Dict[str, str]]:
+    """Lists the items in a folder, following every page of results. With
+    recursive=True subfolders are listed as well, several folders at a time
+
+    Args:
+        drive_folder_id (str): The folder to list
+        page_size (int, optional): How many items to request per page. Defaults to 1000.
+        fields (str, optional): The file fields to return. Defaults to "id, name".
+        recursive (bool, optional): Also list the contents of subfolders. Defaults to False.
+        drive_id (str, optional): The shared drive the folder is on. Items on shared drives
+            are included either way; this restricts the search to one drive. Defaults to None.
+        max_workers (int, optional): How many folders to list concurrently. Defaults to 8.
 
+    Yields:
+        Iterator[Dict[str, str]]: The items in the folder and, if recursive, its subfolders
 
-def get_item(item_id: str) -> Dict[str, str]:
-    request = (
+    >>> for item in list_files_in_directory("1AbC...", recursive=True):
+    ...     print(item["name"])
+    """
+    if not recursive:
+        yield from _list_folder(drive_folder_id, page_size, fields, drive_id)
+        return
+    # The mimeType is needed to tell which items are folders
+    list_fields = fields if "mimeType" in fields else f"{fields}, mimeType"
+
+    def list_folder(folder_id: str) -> List[Dict[str, str]]:
+        return list(_list_folder(folder_id, page_size, list_fields, drive_id))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(list_folder, drive_folder_id)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for item in future.result():
+                    if item.get("mimeType") == FOLDER_MIMETYPE:
+                        pending.add(executor.submit(list_folder, item["id"]))
+                    yield item
+
+
+def get_item(item_id: str, use_cache: bool = True) -> Dict[str, str]:
+    """Returns the metadata of an item. Lookups are cached for a few minutes
+
+    Args:
+        item_id (str): The id of the item
+        use_cache (bool, optional): Return cached metadata when available. Defaults to True.
+
+    Returns:
+        Dict[str, str]: The item's metadata
+    """
+    if use_cache:
+        item = _item_cache.get(item_id)
+        if item is not None:
+            return item
+    item = (
         _service()
         .files()
         .get(fileId=item_id, fields=get_default_fields(), supportsAllDrives=True)
+        .execute()
     )
-    return request.execute()
+    _item_cache.set(item_id, item)
+    return item
 
 
-def download_file(file_id: str) -> BytesIO:
-    item = get_item(file_id)
+def _download_to(
+    item: Dict[str, str], file_handler: IO[bytes], chunk_size: int
+) -> None:
+    """Downloads an item into a file object, exporting Google Docs to their Office
+    equivalent
+
+    Args:
+        item (Dict[str, str]): The item's metadata
+        file_handler (IO[bytes]): The file object to write to
+        chunk_size (int): How many bytes to download per request
+    """
+    files = _service().files()
     if "google-apps" in item["mimeType"]:
-        request = (
-            _service()
-            .files()
-            .export_media(
-                fileId=item["id"],
-                mimeType=google_doc_mimetype(item["mimeType"]),
-            )
+        request = files.export_media(
+            fileId=item["id"],
+            mimeType=google_doc_mimetype(item["mimeType"]),
         )
     else:
-        request = _service().files().get_media(fileId=item["id"])
-    file_handler = io.BytesIO()
-    downloader = MediaIoBaseDownload(file_handler, request)
+        request = files.get_media(fileId=item["id"], supportsAllDrives=True)
+    downloader = MediaIoBaseDownload(file_handler, request, chunksize=chunk_size)
     done = False
     while not done:
-        status, done = downloader.next_chunk()
-        logger.info(
-            f"Downloading item '{item['name']}': {str(status.progress() * 100)}%",
+        status, done = downloader.next_chunk(num_retries=NUM_RETRIES)
+        logger.debug(
+            f"Downloading item '{item['name']}': {status.progress() * 100:.0f}%"
         )
-    return file_handler
+
+
+def download_file(
+    file_id: str, local_path: str = None, chunk_size: int = DOWNLOAD_CHUNK_SIZE
+) -> Union[BytesIO, str]:
+    """Downloads a file into memory or, when local_path is given, streams it to disk
+
+    Args:
+        file_id (str): The id of the file
+        local_path (str, optional): The local path to write to. Defaults to None.
+        chunk_size (int, optional): How many bytes to download per request. Defaults to 8MB.
+
+    Returns:
+        Union[BytesIO, str]: The file's contents, or local_path when writing to disk
+    """
+    item = get_item(file_id)
+    if local_path is None:
+        file_handler = io.BytesIO()
+        _download_to(item, file_handler, chunk_size)
+        logger.info(f"Downloaded item '{item['name']}'")
+        return file_handler
+    # Written next to the destination first so a failed download leaves no partial file
+    temp_path = f"{local_path}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        with open(temp_path, "wb") as file_handler:
+            _download_to(item, file_handler, chunk_size)
+        os.replace(temp_path, local_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    logger.info(f"Downloaded item '{item['name']}' -> {local_path}")
+    return local_path
+
+
+def download_many(
+    files: Dict[str, str],
+    max_workers: int = 8,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+) -> List[TransferResult]:
+    """Downloads many files to disk concurrently. A failed download doesn't stop the
+    others; its result has an error instead
+
+    Args:
+        files (Dict[str, str]): Local paths keyed by file id
+        max_workers (int, optional): How many files to download concurrently. Defaults to 8.
+        chunk_size (int, optional): How many bytes to download per request. Defaults to 8MB.
+
+    Returns:
+        List[TransferResult]: The result of each download
+
+    >>> download_many({"1AbC...": "exports/a.xlsx", "1DeF...": "exports/b.csv"})
+    """
+
+    def download(file_id: str, local_path: str) -> None:
+        download_file(file_id, local_path, chunk_size)
+
+    return transfer_many("Downloaded", download, files, max_workers)
 
 
 def upload_file(
@@ -81,8 +246,10 @@ def upload_file(
     parent_id: str = None,
     mime_type="text/csv",
     fields: str = "id",
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
 ) -> Dict[str, str]:
-    """Uploads a CSV from a local file
+    """Uploads a CSV from a local file. The upload is resumable and sent in chunks, so
+    a failed chunk is retried on its own instead of restarting the upload
 
     Args:
         name_on_drive (str): What to name the CSV file on Google Drive
@@ -90,20 +257,63 @@ def upload_file(
         parent_id (str, optional): The parent id (ie folder) to use. Defaults to None.
         mime_type (str, optional): The mimetype to use. Defaults to 'text/csv'.
         fields (List[str], optional): The fields to return. Defaults to ["id"].
+        chunk_size (int, optional): How many bytes to upload per request, a multiple of 256KB. Defaults to 8MB.
 
     Returns:
         Dict[str, str]: A Google Drive API response including the newly created file id
     """
     meta_data = {"name": name_on_drive, "mimeType": mime_type}
     if parent_id:
-        meta_data["parents"] = parent_id
-    media = MediaFileUpload(filename=local_path, mimetype=mime_type)
-    return (
+        meta_data["parents"] = [parent_id]
+    media = MediaFileUpload(
+        filename=local_path, mimetype=mime_type, chunksize=chunk_size, resumable=True
+    )
+    request = (
         _service()
         .files()
-        .create(body=meta_data, media_body=media, fields=fields)
-        .execute()
+        .create(body=meta_data, media_body=media, fields=fields, supportsAllDrives=True)
     )
+    response = None
+    while response is None:
+        status, response = request.next_chunk(num_retries=NUM_RETRIES)
+        if status:
+            logger.debug(f"Uploading '{name_on_drive}': {status.progress() * 100:.0f}%")
+    logger.info(f"Uploaded {local_path} -> '{name_on_drive}'")
+    return response
+
+
+def upload_many(
+    local_dir: str,
+    parent_id: str,
+    pattern: str = "*",
+    max_workers: int = 8,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> List[TransferResult]:
+    """Uploads the files in a local directory into a Drive folder concurrently, keeping
+    their names and guessing their mimetypes from the extension. A failed upload
+    doesn't stop the others; its result has an error instead
+
+    Args:
+        local_dir (str): The directory to upload files from. Subdirectories are skipped.
+        parent_id (str): The folder to upload to
+        pattern (str, optional): A glob pattern selecting the files to upload. Defaults to "*".
+        max_workers (int, optional): How many files to upload concurrently. Defaults to 8.
+        chunk_size (int, optional): How many bytes to upload per request. Defaults to 8MB.
+
+    Returns:
+        List[TransferResult]: The result of each upload
+
+    >>> upload_many("exports", "1AbC...", pattern="*.csv")
+    """
+    files = {
+        str(path): path.name for path in Path(local_dir).glob(pattern) if path.is_file()
+    }
+
+    def upload(source: str, destination: str) -> None:
+        mime_type = mimetypes.guess_type(source)[0] or "application/octet-stream"
+        upload_file(destination, source, parent_id, mime_type, chunk_size=chunk_size)
+
+    return transfer_many("Uploaded", upload, files, max_workers)
 
 
 def share_file(emails: List[str], item_id: str, role: str = "writer") -> None:
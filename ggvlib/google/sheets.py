@@ -1,10 +1,23 @@
+import datetime
 import itertools
-import re
-import string
-from typing import Dict, List
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Any, Dict, List, Tuple, Union
+from ggvlib.google.a1 import (
+    column_to_index,
+    format_range,
+    index_to_column,
+    parse_range,
+    range_from_start,
+)
 from ggvlib.logging import logger
+from ggvlib.parsing import chunks
 import google.auth
 from googleapiclient.discovery import build, Resource
+import numpy as np
 import pandas as pd
 
 
@@ -13,19 +26,56 @@ DEFAULT_SCOPES = [
     "https://www.googleapis.com/auth/drive.file",
     "https://www.googleapis.com/auth/spreadsheets",
 ]
+# Keeps the request URL of values.batchGet well below its length limit
+MAX_RANGES_PER_REQUEST = 100
+# Google recommends keeping request payloads below 2MB
+MAX_REQUEST_BYTES = 2 * 1024 * 1024
+WRITE_REQUESTS_PER_MINUTE = 60
+# Retries rate limited and failed requests with exponential backoff
+NUM_RETRIES = 5
+# Sheets counts date serial numbers in days from this date
+SERIAL_DATE_ORIGIN = "1899-12-30"
+
+_local = threading.local()
 
 
 def _client() -> Resource:
-    credentials, _ = google.auth.default(scopes=DEFAULT_SCOPES)
-    return build("sheets", "v4", credentials=credentials)
+    """Returns a Sheets service, built once per thread. Building the service
+    is slow, and services can't be shared between threads since httplib2 isn't
+    thread safe
+
+    Returns:
+        Resource: A Google Sheets service
+    """
+    if getattr(_local, "service", None) is None:
+        credentials, _ = google.auth.default(scopes=DEFAULT_SCOPES)
+        _local.service = build(
+            "sheets", "v4", credentials=credentials, cache_discovery=False
+        )
+    return _local.service
 
 
-def get_range(sheet_id: str, sheet_range: str) -> Dict[str, str]:
+def _render_options(typed: bool) -> Dict[str, str]:
+    """Returns the options for reading values as numbers, booleans and date serial
+    numbers instead of formatted strings
+    """
+    if typed:
+        return {
+            "valueRenderOption": "UNFORMATTED_VALUE",
+            "dateTimeRenderOption": "SERIAL_NUMBER",
+        }
+    return {}
+
+
+def get_range(
+    sheet_id: str, sheet_range: str, typed: bool = False
+) -> Dict[str, str]:
     """Returns a dictionary containing data for a range of a sheet
 
     Parameters:
         sheet_id (string): The id of sheet to gather data from (can be found in the URL)
         sheet_range (string): The range to gather data from; using only the sheet name will return the entire sheet
+        typed (bool): Return unformatted numbers and booleans, and dates as serial numbers. Defaults to False.
 
     Returns:
         Dict[str, str]: The resulting data
@@ -40,32 +90,157 @@ def get_range(sheet_id: str, sheet_range: str) -> Dict[str, str]:
         _client()
         .spreadsheets()
         .values()
-        .get(spreadsheetId=sheet_id, range=sheet_range)
+        .get(spreadsheetId=sheet_id, range=sheet_range, **_render_options(typed))
         .execute()
     )
 
 
+def _values_to_df(
+    values: List[list],
+    header_row: int = 0,
+    typed: bool = False,
+    date_columns: List[str] = None,
+) -> pd.DataFrame:
+    """Builds a DataFrame from the values of a range, padding rows which are shorter
+    than the widest row since the API omits trailing empty cells
+
+    Args:
+        values (List[list]): The values of the range
+        header_row (int, optional): The index of the row to use as a header. Defaults to 0.
+        typed (bool, optional): Infer column dtypes from unformatted values. Defaults to False.
+        date_columns (List[str], optional): Columns of date serial numbers to convert to datetimes. Defaults to None.
+
+    Raises:
+        Exception: If the range has no row at header_row
+
+    Returns:
+        pd.DataFrame: The resulting data
+    """
+    if len(values) <= header_row:
+        raise Exception("Specified range has no data")
+    rows = values[header_row + 1 :]
+    width = max(len(row) for row in values[header_row:])
+    header = list(values[header_row]) + [
+        f"column_{i}" for i in range(len(values[header_row]), width)
+    ]
+    df = pd.DataFrame(
+        [row + [None] * (width - len(row)) for row in rows], columns=header
+    )
+    if not typed:
+        return df
+    df = df.replace("", None).convert_dtypes()
+    for column in date_columns or []:
+        df[column] = pd.to_datetime(
+            pd.to_numeric(df[column]), unit="D", origin=SERIAL_DATE_ORIGIN
+        )
+    return df
+
+
 def get_range_as_df(
-    sheet_id: str, sheet_range: str, header_row=0
+    sheet_id: str,
+    sheet_range: str,
+    header_row=0,
+    typed: bool = False,
+    date_columns: List[str] = None,
 ) -> pd.DataFrame:
-    """Returns a dictionary containing data for an entire sheet
+    """Returns a DataFrame containing data for a range of a sheet. With typed=True values
+    are read unformatted and column dtypes (numbers, booleans, strings) are inferred per
+    column, instead of every value being a string
 
     Parameters:
         sheet_id (string): The id of sheet to gather data from (can be found in the URL)
         sheet_range (string): The range to gather data from; using only the sheet name will return the entire sheet
         header_row (int): The index of the row to use as a header for the DataFrame
+        typed (bool): Infer column dtypes from unformatted values. Defaults to False.
+        date_columns (List[str]): With typed=True, columns of dates to convert from serial numbers to datetimes.
+            Defaults to None.
 
     Returns:
         pd.DataFrame: The resulting data
     """
-    range_data = get_range(sheet_id, sheet_range)
-    if len(range_data.get("values", [])) > header_row:
-        return pd.DataFrame(
-            range_data["values"][header_row + 1 :],
-            columns=range_data["values"][0],
+    range_data = get_range(sheet_id, sheet_range, typed=typed)
+    return _values_to_df(
+        range_data.get("values", []), header_row, typed, date_columns
+    )
+
+
+def batch_get_ranges(
+    sheet_id: str, sheet_ranges: List[str], typed: bool = False
+) -> List[dict]:
+    """Returns data for many ranges of a sheet using values.batchGet, which needs one
+    request for up to 100 ranges instead of a request per range
+
+    Parameters:
+        sheet_id (string): The id of sheet to gather data from (can be found in the URL)
+        sheet_ranges (List[str]): The ranges to gather data from
+        typed (bool): Return unformatted numbers and booleans, and dates as serial numbers. Defaults to False.
+
+    Returns:
+        List[dict]: The data of each range, in the same order as sheet_ranges
+
+    >>> batch_get_ranges(sheet_id="example_id", sheet_ranges=["Sheet1!A1:B2", "Sheet2"])
+    [{'range': 'Sheet1!A1:B2', 'majorDimension': 'ROWS', 'values': [['a', 'b'], ['1', '2']]}, {'range': 'Sheet2!A1:Z1000', ...}]
+    """
+    logger.info(
+        f"Getting cell data from {len(sheet_ranges)} range(s) in Google Sheet with id {sheet_id}"
+    )
+    value_ranges = []
+    for batch in chunks(sheet_ranges, MAX_RANGES_PER_REQUEST):
+        response = (
+            _client()
+            .spreadsheets()
+            .values()
+            .batchGet(
+                spreadsheetId=sheet_id, ranges=batch, **_render_options(typed)
+            )
+            .execute()
         )
-    else:
-        raise Exception("Specified range has no data")
+        value_ranges.extend(response.get("valueRanges", []))
+    return value_ranges
+
+
+def get_ranges(
+    sheet_id: str,
+    sheet_ranges: List[str],
+    header_row=0,
+    typed: bool = False,
+    date_columns: Dict[str, List[str]] = None,
+    raise_on_empty: bool = False,
+) -> Dict[str, pd.DataFrame]:
+    """Returns DataFrames for many ranges of a sheet, fetched with values.batchGet.
+    Ranges without data become empty DataFrames, so one blank tab doesn't fail the
+    whole read
+
+    Parameters:
+        sheet_id (string): The id of sheet to gather data from (can be found in the URL)
+        sheet_ranges (List[str]): The ranges to gather data from
+        header_row (int): The index of the row to use as a header for each DataFrame
+        typed (bool): Infer column dtypes from unformatted values. Defaults to False.
+        date_columns (Dict[str, List[str]]): With typed=True, date columns to convert keyed by range.
+            Defaults to None.
+        raise_on_empty (bool): Raise instead of returning an empty DataFrame for ranges without data.
+            Defaults to False.
+
+    Raises:
+        Exception: If raise_on_empty is set and a range has no row at header_row
+
+    Returns:
+        Dict[str, pd.DataFrame]: A DataFrame for each range, keyed by the requested range
+    """
+    date_columns = date_columns or {}
+    dfs = {}
+    for sheet_range, value_range in zip(
+        sheet_ranges, batch_get_ranges(sheet_id, sheet_ranges, typed=typed)
+    ):
+        values = value_range.get("values", [])
+        if len(values) <= header_row and not raise_on_empty:
+            logger.warning(f"Range {sheet_range} has no data")
+            dfs[sheet_range] = pd.DataFrame()
+            continue
+        dfs[sheet_range] = _values_to_df(
+            values, header_row, typed, date_columns.get(sheet_range)
+        )
+    return dfs
 
 
 def update_range(
@@ -98,46 +273,414 @@ def update_range(
             valueInputOption="USER_ENTERED",
             body=data,
         )
-        .execute()
+        .execute(num_retries=NUM_RETRIES)
+    )
+
+
+def _df_range(range_start: str, df: pd.DataFrame) -> str:
+    """Returns the range a DataFrame covers when written from its upper left corner
+
+    Args:
+        range_start (str): The upper left corner, ie Sheet1!B2
+        df (pd.DataFrame): The DataFrame
+
+    Raises:
+        Exception: If range_start doesn't include a sheet name
+
+    Returns:
+        str: The range, ie Sheet1!B2:D10
+    """
+    if "!" in range_start:
+        return str(range_from_start(range_start, len(df), len(df.columns)))
+    else:
+        raise Exception(
+            "Invalid range_start provided. Make sure you include a '!'."
+        )
+
+
+def _serialize_object(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str)
+    return value
+
+
+def _df_values(df: pd.DataFrame) -> List[list]:
+    """Converts a DataFrame to a list of rows which can be serialized as JSON.
+    Datetime columns become date strings which Sheets parses as dates, missing
+    values become empty cells, and only object columns are converted value by value
+
+    Args:
+        df (pd.DataFrame): The DataFrame to convert
+
+    Returns:
+        List[list]: The rows
+    """
+    columns = {}
+    for i in range(len(df.columns)):
+        series = df.iloc[:, i]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            present = series.dropna()
+            date_format = (
+                "%Y-%m-%d"
+                if (present.dt.normalize() == present).all()
+                else "%Y-%m-%d %H:%M:%S"
+            )
+            series = series.dt.strftime(date_format)
+        elif pd.api.types.is_timedelta64_dtype(series):
+            series = series.astype(str).where(series.notna())
+        elif series.dtype == object:
+            series = series.map(_serialize_object)
+        columns[i] = series.astype(object).where(series.notna(), "")
+    if not columns:
+        return [[] for _ in range(len(df))]
+    return pd.DataFrame(columns).values.tolist()
+
+
+class _Throttle:
+    """Spaces out requests made from many threads to stay below a per minute quota"""
+
+    def __init__(self, requests_per_minute: int) -> None:
+        self.interval = 60 / requests_per_minute
+        self.next_request = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            delay = self.next_request - now
+            self.next_request = max(now, self.next_request) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _changed_cells(
+    current: List[list], new: List[list], date_columns: List[int], atol: float = 0
+) -> np.ndarray:
+    """Compares the current values of a range with the values to write
+
+    Args:
+        current (List[list]): Unformatted values read from the sheet, with dates as serial numbers
+        new (List[list]): Values serialized with _df_values
+        date_columns (List[int]): Positions of columns holding dates
+        atol (float, optional): How far apart two numbers can be and still count as unchanged. Defaults to 0.
+
+    Returns:
+        np.ndarray: A boolean mask of the cells which differ
+    """
+    rows, cols = len(new), len(new[0]) if new else 0
+    current_df = pd.DataFrame(
+        [row[:cols] + [""] * (cols - len(row[:cols])) for row in current[:rows]]
+        + [[""] * cols] * (rows - len(current[:rows])),
+        columns=range(cols),
+        dtype=object,
+    )
+    new_df = pd.DataFrame(new, columns=range(cols), dtype=object)
+    mask = np.zeros((rows, cols), dtype=bool)
+    for i in range(cols):
+        old, value = current_df[i], new_df[i]
+        new_numbers = pd.to_numeric(value, errors="coerce")
+        if i in date_columns:
+            dates = pd.to_datetime(value.replace("", None))
+            new_numbers = (dates - pd.Timestamp(SERIAL_DATE_ORIGIN)) / pd.Timedelta(
+                days=1
+            )
+        old_numbers = pd.to_numeric(old, errors="coerce")
+        both_numbers = old_numbers.notna() & new_numbers.notna()
+        same = np.where(
+            both_numbers,
+            (old_numbers - new_numbers).abs() <= atol,
+            old.astype(str) == value.astype(str),
+        )
+        mask[:, i] = ~same
+    return mask
+
+
+def _changed_rectangles(mask: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """Groups changed cells into rectangles, merging runs of changed cells in a row
+    with identical runs in the rows below
+
+    Args:
+        mask (np.ndarray): A boolean mask of changed cells
+
+    Returns:
+        List[Tuple[int, int, int, int]]: Rectangles as (first row, first column, last row, last column)
+    """
+    rectangles = []
+    active: Dict[Tuple[int, int], int] = {}
+    for r in range(mask.shape[0] + 1):
+        runs = set()
+        if r < mask.shape[0]:
+            edges = np.diff(np.concatenate(([0], mask[r].astype(np.int8), [0])))
+            runs = set(
+                zip(
+                    np.flatnonzero(edges == 1).tolist(),
+                    (np.flatnonzero(edges == -1) - 1).tolist(),
+                )
+            )
+        for run in list(active):
+            if run not in runs:
+                rectangles.append((active.pop(run), run[0], r - 1, run[1]))
+        for run in runs:
+            active.setdefault(run, r)
+    return rectangles
+
+
+def _update_changed_cells(
+    sheet_id: str, sheet_range: str, df: pd.DataFrame, values: List[list]
+) -> Dict[str, str]:
+    """Writes only the cells of a range which differ from a DataFrame
+
+    Args:
+        sheet_id (str): The sheet to update data in
+        sheet_range (str): The range covered by the DataFrame
+        df (pd.DataFrame): The DataFrame
+        values (List[list]): The DataFrame's values serialized with _df_values
+
+    Returns:
+        Dict[str, str]: The updated data
+    """
+    current = get_range(sheet_id, sheet_range, typed=True).get("values", [])
+    date_columns = [
+        i
+        for i in range(len(df.columns))
+        if pd.api.types.is_datetime64_any_dtype(df.iloc[:, i])
+    ]
+    mask = _changed_cells(current, values, date_columns)
+    rectangles = _changed_rectangles(mask)
+    logger.info(
+        f"{int(mask.sum())} of {mask.size} cell(s) changed in {sheet_range}, "
+        f"writing {len(rectangles)} range(s)"
     )
+    a1_range = parse_range(sheet_range)
+    data = {
+        format_range(
+            a1_range._replace(
+                start_col=a1_range.start_col + first_col,
+                start_row=a1_range.start_row + first_row,
+                end_col=a1_range.start_col + last_col,
+                end_row=a1_range.start_row + last_row,
+            )
+        ): [row[first_col : last_col + 1] for row in values[first_row : last_row + 1]]
+        for first_row, first_col, last_row, last_col in rectangles
+    }
+    if data:
+        update_ranges(sheet_id, data, value_input_option="USER_ENTERED")
+    return {
+        "spreadsheetId": sheet_id,
+        "updatedRange": sheet_range,
+        "updatedRanges": len(data),
+        "updatedCells": int(mask.sum()),
+    }
 
 
 def update_range_from_df(
-    sheet_id: str, range_start: str, df: pd.DataFrame
+    sheet_id: str,
+    range_start: str,
+    df: pd.DataFrame,
+    max_request_bytes: int = MAX_REQUEST_BYTES,
+    max_workers: int = 1,
+    requests_per_minute: int = WRITE_REQUESTS_PER_MINUTE,
+    diff: bool = False,
 ) -> Dict[str, str]:
-    """Updates data in a specified sheet range using a DataFrame
+    """Updates data in a specified sheet range using a DataFrame. Large DataFrames are
+    written in bands of rows which each stay below max_request_bytes, optionally
+    from several threads, throttled to requests_per_minute. With diff=True the range is
+    read first and only the rectangles of cells which changed are written, in one
+    batchUpdate
 
     Parameters:
         sheet_id (string): The sheet to update data in
         range_start (string): The upper left corner of the sheet
         df (pd.DataFrame): A DataFrame to update the sheet with
+        max_request_bytes (int): The maximum approximate payload size of each request. Defaults to 2MB.
+        max_workers (int): How many bands to write concurrently. Defaults to 1.
+        requests_per_minute (int): The maximum rate of write requests. Defaults to 60,
+            the default per user write quota.
+        diff (bool): Only write the cells which differ from the sheet. Defaults to False.
 
     Returns:
         Dict[str, str]: The updated data
     """
-    if "!" in range_start:
-        exclm_index = re.match(r"(?s:.*)(!)", range_start).span()[1]
-        sheet_name = range_start[: exclm_index - 1]
-        start_cell = range_start[exclm_index:]
-        start_col = re.search(r"[A-Z]+", start_cell).group()
-        start_row = int(re.search(r"[0-9]+", start_cell).group())
-
-        col_range_start = excel_col_value(start_col)
-        col_range = list(
-            itertools.islice(excel_cols(), col_range_start + len(df.columns))
-        )[col_range_start:]
-
-        row_range = list(range(start_row, start_row + len(df)))
-        cell_range = f"{sheet_name}!{col_range[0]}{row_range[0]}:{col_range[-1]}{row_range[-1]}"
+    sheet_range = _df_range(range_start, df)
+    values = _df_values(df)
+    if diff:
+        return _update_changed_cells(sheet_id, sheet_range, df, values)
+    value_ranges = _split_value_range(sheet_range, values, max_request_bytes)
+    if len(value_ranges) == 1:
         return update_range(
             sheet_id=sheet_id,
-            sheet_range=cell_range,
-            values=df.values.tolist(),
+            sheet_range=sheet_range,
+            values=value_ranges[0]["values"],
         )
-    else:
-        raise Exception(
-            "Invalid range_start provided. Make sure you include a '!'."
+    logger.info(f"Writing {sheet_range} in {len(value_ranges)} request(s)")
+    throttle = _Throttle(requests_per_minute)
+
+    def write(value_range: dict) -> dict:
+        throttle.wait()
+        return update_range(
+            sheet_id=sheet_id,
+            sheet_range=value_range["range"],
+            values=value_range["values"],
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        responses = list(executor.map(write, value_ranges))
+    return {
+        "spreadsheetId": sheet_id,
+        "updatedRange": sheet_range,
+        "updatedRows": sum(r.get("updatedRows", 0) for r in responses),
+        "updatedColumns": max(r.get("updatedColumns", 0) for r in responses),
+        "updatedCells": sum(r.get("updatedCells", 0) for r in responses),
+    }
+
+
+def _needs_user_entered(values: List[list]) -> bool:
+    """Checks whether values contain formulas, which are only evaluated when
+    written with the USER_ENTERED input option
+    """
+    return any(
+        isinstance(value, str) and value.startswith("=")
+        for row in values
+        for value in row
+    )
+
+
+def _has_dates(df: pd.DataFrame) -> bool:
+    """Checks whether a DataFrame has date, time or duration values, which _df_values
+    writes as strings that Sheets only parses when written as USER_ENTERED
+    """
+    for i in range(len(df.columns)):
+        series = df.iloc[:, i]
+        if pd.api.types.is_datetime64_any_dtype(
+            series
+        ) or pd.api.types.is_timedelta64_dtype(series):
+            return True
+        if series.dtype == object and any(
+            isinstance(value, (datetime.date, datetime.time, datetime.timedelta))
+            for value in series
+        ):
+            return True
+    return False
+
+
+def _split_value_range(
+    sheet_range: str, values: List[list], max_bytes: int
+) -> List[dict]:
+    """Splits the values of a range into row bands whose JSON payload stays below max_bytes.
+    Ranges without explicit row numbers are not split
+
+    Args:
+        sheet_range (str): The range, ie Sheet1!A1:D1000
+        values (List[list]): The values of the range
+        max_bytes (int): The maximum approximate payload size of each band
+
+    Returns:
+        List[dict]: Value ranges in the format used by values.batchUpdate
+    """
+    a1_range = parse_range(sheet_range)
+    if a1_range.start_row is None:
+        return [{"range": sheet_range, "values": values}]
+    value_ranges, band, band_start, size = [], [], 0, 0
+    for i, row in enumerate(values):
+        row_size = len(json.dumps(row, default=str)) + 1
+        if band and size + row_size > max_bytes:
+            value_ranges.append((band_start, band))
+            band, band_start, size = [], i, 0
+        band.append(row)
+        size += row_size
+    value_ranges.append((band_start, band))
+    return [
+        {
+            "range": format_range(
+                a1_range._replace(
+                    start_row=a1_range.start_row + offset,
+                    end_row=a1_range.start_row + offset + len(band) - 1,
+                )
+            ),
+            "values": band,
+        }
+        for offset, band in value_ranges
+    ]
+
+
+def update_ranges(
+    sheet_id: str,
+    data: Dict[str, Union[pd.DataFrame, List[list]]],
+    value_input_option: str = "AUTO",
+    max_request_bytes: int = MAX_REQUEST_BYTES,
+) -> List[dict]:
+    """Updates many ranges of a sheet using values.batchUpdate. Ranges are packed into
+    as few requests as possible while keeping each request below max_request_bytes;
+    ranges which are larger on their own are split into bands of rows
+
+    Parameters:
+        sheet_id (string): The sheet to update data in
+        data (Dict[str, Union[pd.DataFrame, List[list]]]): The data to write keyed by range.
+            DataFrames are keyed by their upper left corner, ie Sheet1!A1, lists of values by their full range
+        value_input_option (string): RAW, USER_ENTERED or AUTO, which writes ranges containing
+            formulas and DataFrames containing dates as USER_ENTERED and everything else as RAW,
+            so strings are stored as-is instead of being parsed. Defaults to AUTO.
+        max_request_bytes (int): The maximum approximate payload size of each request. Defaults to 2MB.
+
+    Returns:
+        List[dict]: The response of each batchUpdate request
+
+    >>> update_ranges(sheet_id="example_id", data={"Sheet1!A1": df, "Sheet2!C1:D2": [[1, 2], [3, 4]]})
+    [{'spreadsheetId': 'example_id', 'totalUpdatedRows': 12, 'totalUpdatedColumns': 4, ...}]
+    """
+    groups: Dict[str, List[dict]] = {"RAW": [], "USER_ENTERED": []}
+    for sheet_range, values in data.items():
+        has_dates = False
+        if isinstance(values, pd.DataFrame):
+            has_dates = _has_dates(values)
+            sheet_range, values = _df_range(sheet_range, values), _df_values(values)
+        if value_input_option == "AUTO":
+            user_entered = has_dates or _needs_user_entered(values)
+            option = "USER_ENTERED" if user_entered else "RAW"
+        else:
+            option = value_input_option
+        groups.setdefault(option, []).extend(
+            _split_value_range(sheet_range, values, max_request_bytes)
+        )
+    responses = []
+    for option, value_ranges in groups.items():
+        batch, size = [], 0
+        for value_range in value_ranges:
+            range_size = len(json.dumps(value_range, default=str))
+            if batch and size + range_size > max_request_bytes:
+                responses.append(_batch_update(sheet_id, batch, option))
+                batch, size = [], 0
+            batch.append(value_range)
+            size += range_size
+        if batch:
+            responses.append(_batch_update(sheet_id, batch, option))
+    return responses
+
+
+def _batch_update(
+    sheet_id: str, value_ranges: List[dict], value_input_option: str
+) -> dict:
+    logger.info(
+        f"Updating cell data in {len(value_ranges)} range(s) in Google Sheet with id {sheet_id}"
+    )
+    return (
+        _client()
+        .spreadsheets()
+        .values()
+        .batchUpdate(
+            spreadsheetId=sheet_id,
+            body={"valueInputOption": value_input_option, "data": value_ranges},
         )
+        .execute(num_retries=NUM_RETRIES)
+    )
 
 
 def excel_col_value(column_letter_value: str) -> int:
@@ -147,27 +690,15 @@ def excel_col_value(column_letter_value: str) -> int:
         column_letter_value (str): The column letter ie AB
 
     Returns:
-        int: The index
+        int: The 0-based index
     """
-    if len(column_letter_value) <= 2:
-        values = []
-        multiplier = 0
-        for l in column_letter_value[::-1]:
-            values.append(string.ascii_uppercase.index(l) + (multiplier * 26))
-            multiplier += 1
-        return sum(values)
+    return column_to_index(column_letter_value)
 
 
 def excel_cols():
     """Returns alphabetical indexes for Google Sheets / Excel columns
 
     Yields:
-        _type_: _description_
+        str: Column letters, starting from A
     """
-    n = 1
-    while True:
-        yield from (
-            "".join(group)
-            for group in itertools.product(string.ascii_uppercase, repeat=n)
-        )
-        n += 1
+    return (index_to_column(i) for i in itertools.count())
@@ -1,11 +1,59 @@
+import base64
+import datetime
+import functools
+import hashlib
+import json
+import mimetypes
 import os
-from io import BytesIO, StringIO
-from typing import List, Union
+import re
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from io import BytesIO, StringIO, TextIOWrapper
+from typing import (
+    BinaryIO,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Union,
+)
 from google.cloud import storage
 from google.cloud.storage.acl import ObjectACL
+from google.cloud.storage.fileio import BlobReader, BlobWriter
+import google_crc32c
+from pydantic import BaseModel
+from ggvlib.google.transfer import TransferResult, transfer_many
 from ggvlib.logging import logger
 
 ALLOWED_ROLES = ["WRITER", "READER", "OWNER"]
+# A compose request accepts at most 32 source objects
+MAX_COMPOSE_COMPONENTS = 32
+COMPOSITE_UPLOAD_THRESHOLD = 256 * 1024 * 1024
+COMPOSITE_UPLOAD_MIN_PART_SIZE = 32 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+SLICED_DOWNLOAD_THRESHOLD = 256 * 1024 * 1024
+SLICED_DOWNLOAD_SLICE_SIZE = 64 * 1024 * 1024
+SYNC_DIRECTIONS = ["upload", "download"]
+SYNC_COMPARISONS = ["size", "md5", "crc32c"]
+
+
+@functools.lru_cache(maxsize=None)
+def _client() -> storage.Client:
+    """Returns a storage.Client which is shared between calls and threads, so that
+    connections and credentials are reused
+
+    Returns:
+        storage.Client: A Google Cloud Storage client
+    """
+    return storage.Client()
+
+
+def _bucket_name(bucket_name: Optional[str] = None) -> str:
+    return bucket_name or os.environ["BUCKET"]
 
 
 def upload_from_string(
@@ -18,42 +66,310 @@ def upload_from_string(
         path (str): _description_
         content_type (str, optional): _description_. Defaults to "text/plain".
     """
-    b = os.environ["BUCKET"]
+    b = _bucket_name()
     logger.info(f"Loading bucket: {b}")
-    bucket = storage.Client().bucket(b)
+    bucket = _client().bucket(b)
     bucket.blob(path).upload_from_string(data=data, content_type=content_type)
     logger.info(f"data -> gs://{b}/{path}")
 
 
-def upload_from_file(local_path: str, destination_path: str) -> None:
-    """_summary_
+def _abandon_upload(writer: BlobWriter) -> None:
+    """Discards the buffer of a BlobWriter without finalizing its upload. Closing the
+    writer, explicitly or when it is garbage collected, would publish what was written
+    so far as a truncated object, while an unfinished resumable upload session simply
+    expires
+
+    Args:
+        writer (BlobWriter): The writer to discard
+    """
+    try:
+        writer._buffer.close()
+    except Exception as e:
+        logger.warning(f"Could not discard upload buffer: {e}")
+
+
+def upload_ndjson(
+    rows: Iterable[dict],
+    path: str,
+    bucket_name: str = None,
+    compress: bool = True,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> int:
+    """Streams rows to a blob as new line delimited JSON through a resumable upload,
+    compressing them with gzip on the fly. Only one chunk is held in memory at a time,
+    so rows can come straight from a generator, ie a paginated API export
+
+    Args:
+        rows (Iterable[dict]): The rows to upload
+        path (str): The path of the blob to create, ie "exports/contacts.json.gz"
+        bucket_name (str, optional): The bucket to upload to. Defaults to the BUCKET environment variable.
+        compress (bool, optional): Whether to gzip the data. Defaults to True.
+        chunk_size (int, optional): How many bytes to upload per request, a multiple of 256KB. Defaults to 8MB.
+
+    Returns:
+        int: The amount of rows uploaded
+
+    >>> upload_ndjson(client.iter_contacts(), "exports/contacts.json.gz")
+    125000
+    """
+    b = _bucket_name(bucket_name)
+    blob = _client().bucket(b).blob(path)
+    count = 0
+    writer = blob.open(
+        "wb",
+        chunk_size=chunk_size,
+        ignore_flush=True,
+        content_type="application/gzip" if compress else "application/x-ndjson",
+    )
+    # A raw gzip stream, unlike GzipFile, writes nothing to the writer when discarded
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    try:
+        for row in rows:
+            data = json.dumps(row, default=str).encode("utf-8") + b"\n"
+            writer.write(compressor.compress(data) if compress else data)
+            count += 1
+        if compress:
+            writer.write(compressor.flush())
+        writer.close()
+    except Exception:
+        logger.error(f"Upload to gs://{b}/{path} failed after {count} row(s)")
+        _abandon_upload(writer)
+        raise
+    logger.info(f"{count} row(s) -> gs://{b}/{path}")
+    return count
+
+
+def file_crc32c(local_path: str, chunk_size: int = 8 * 1024 * 1024) -> str:
+    """Computes the base64 encoded CRC32C checksum of a local file, in the format
+    Google Cloud Storage reports for blobs
+
+    Args:
+        local_path (str): The path of the file
+        chunk_size (int, optional): How many bytes to read at a time. Defaults to 8MB.
+
+    Returns:
+        str: The base64 encoded checksum
+    """
+    checksum = google_crc32c.Checksum()
+    with open(local_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            checksum.update(chunk)
+    return base64.b64encode(checksum.digest()).decode("utf-8")
+
+
+def _upload_part(
+    bucket: storage.Bucket,
+    local_path: str,
+    part_path: str,
+    offset: int,
+    length: int,
+    chunk_size: Optional[int],
+) -> storage.Blob:
+    blob = bucket.blob(part_path, chunk_size=chunk_size)
+    with open(local_path, "rb") as f:
+        f.seek(offset)
+        blob.upload_from_file(f, size=length, checksum="crc32c")
+    return blob
+
+
+def _composite_upload(
+    bucket: storage.Bucket,
+    local_path: str,
+    destination_path: str,
+    chunk_size: Optional[int],
+    max_workers: int,
+) -> None:
+    """Uploads a file as parts concurrently and composes them into one blob
+
+    Args:
+        bucket (storage.Bucket): The bucket to upload to
+        local_path (str): The local file
+        destination_path (str): The path of the composed blob
+        chunk_size (Optional[int]): The resumable upload chunk size of each part
+        max_workers (int): How many parts to upload concurrently
+
+    Raises:
+        RuntimeError: Raised when the composed blob's checksum does not match the local file
+    """
+    size = os.path.getsize(local_path)
+    part_count = min(
+        MAX_COMPOSE_COMPONENTS, -(-size // COMPOSITE_UPLOAD_MIN_PART_SIZE)
+    )
+    part_size = -(-size // part_count)
+    part_prefix = f"{destination_path}.parts-{uuid.uuid4().hex}"
+    logger.info(f"Uploading {local_path} as {part_count} part(s)")
+    with ThreadPoolExecutor(max_workers=max_workers + 1) as executor:
+        expected_crc32c = executor.submit(file_crc32c, local_path)
+        futures = [
+            executor.submit(
+                _upload_part,
+                bucket,
+                local_path,
+                f"{part_prefix}/{i:02d}",
+                offset,
+                min(part_size, size - offset),
+                chunk_size,
+            )
+            for i, offset in enumerate(range(0, size, part_size))
+        ]
+        wait(futures)
+        parts = [future.result() for future in futures if not future.exception()]
+        try:
+            for future in futures:
+                if future.exception():
+                    raise future.exception()
+            blob = bucket.blob(destination_path)
+            # Matches the content type upload_from_filename guesses for smaller files
+            blob.content_type = mimetypes.guess_type(local_path)[0]
+            blob.compose(parts)
+        finally:
+            for part in parts:
+                executor.submit(part.delete)
+        if blob.crc32c != expected_crc32c.result():
+            blob.delete()
+            raise RuntimeError(
+                f"Checksum mismatch uploading {local_path} to {destination_path}"
+            )
+
+
+def upload_from_file(
+    local_path: str,
+    destination_path: str,
+    chunk_size: Optional[int] = None,
+    composite_threshold: int = COMPOSITE_UPLOAD_THRESHOLD,
+    max_workers: int = 8,
+) -> None:
+    """Uploads a local file to the bucket set in the BUCKET environment variable. Files
+    larger than composite_threshold are split into parts which are uploaded
+    concurrently, then composed server-side and verified against the local CRC32C
+    checksum. Composed objects have no MD5 hash, and parts count towards early deletion
+    charges on Nearline and colder storage classes
 
     Args:
-        local_path (str): _description_
-        destination_path (str): _description_
+        local_path (str): The path of the file to upload
+        destination_path (str): The path of the blob to create
+        chunk_size (int, optional): The resumable upload chunk size, a multiple of 256KB. Defaults to None.
+        composite_threshold (int, optional): The file size above which a composite upload is used. Defaults to 256MB.
+        max_workers (int, optional): How many parts to upload concurrently. Defaults to 8.
+
+    Raises:
+        RuntimeError: Raised when a composed blob's checksum doesn't match the local file
     """
-    b = os.environ["BUCKET"]
+    b = _bucket_name()
     logger.info(f"Loading bucket: {b}")
-    bucket = storage.Client().bucket(b)
-    blob = bucket.blob(destination_path)
-    blob.upload_from_filename(local_path)
+    bucket = _client().bucket(b)
+    if os.path.getsize(local_path) > composite_threshold:
+        _composite_upload(
+            bucket, local_path, destination_path, chunk_size, max_workers
+        )
+    else:
+        blob = bucket.blob(destination_path, chunk_size=chunk_size)
+        blob.upload_from_filename(local_path, checksum="crc32c")
     logger.info(f"data -> gs://{b}/{destination_path}")
 
 
+def iter_blobs(
+    bucket_name: str,
+    prefix: str = None,
+    delimiter: str = None,
+    fields: List[str] = None,
+    match_glob: str = None,
+    pattern: str = None,
+    updated_since: datetime.datetime = None,
+    page_size: int = 1000,
+    client: Optional[storage.Client] = None,
+) -> Generator[storage.Blob, None, None]:
+    """Lazily lists blobs in a bucket one page at a time, so any amount of objects
+    can be listed in constant memory. Filters are pushed to the API where possible:
+    fields limits the metadata returned for each blob and match_glob filters names
+    server-side, while pattern and updated_since are applied per page
+
+    Args:
+        bucket_name (str): The bucket to list
+        prefix (str, optional): Only list blobs whose names start with this prefix. Defaults to
+            the part of match_glob before its first wildcard.
+        delimiter (str, optional): Don't list blobs nested below this delimiter, ie "/". Defaults to None.
+        fields (List[str], optional): The blob properties to fetch, ie ["name", "size", "updated"].
+            Defaults to every property.
+        match_glob (str, optional): A glob which blob names must match, ie "reports/**.csv". Defaults to None.
+        pattern (str, optional): A regular expression which blob names must match. Defaults to None.
+        updated_since (datetime.datetime, optional): Only list blobs updated after this time,
+            which is taken to be UTC if it has no timezone. Defaults to None.
+        page_size (int, optional): How many blobs to fetch per request. Defaults to 1000.
+        client (storage.Client, optional): The client to use. Defaults to the shared client.
+
+    Yields:
+        Generator[storage.Blob, None, None]: The matching blobs
+
+    >>> for blob in iter_blobs("bucket", match_glob="reports/**.csv", fields=["name", "size"]):
+    ...     print(blob.name, blob.size)
+    """
+    if match_glob and not prefix:
+        prefix = re.split(r"[*?\[{]", match_glob, maxsplit=1)[0]
+    if fields is not None:
+        fields = set(fields) | {"name"}
+        if updated_since:
+            fields.add("updated")
+        fields = f"items({','.join(sorted(fields))}),prefixes,nextPageToken"
+    if updated_since and updated_since.tzinfo is None:
+        # Blob update times are always timezone aware
+        updated_since = updated_since.replace(tzinfo=datetime.timezone.utc)
+    kwargs = {"match_glob": match_glob} if match_glob else {}
+    name_pattern = re.compile(pattern) if pattern else None
+    for blob in (client or _client()).list_blobs(
+        bucket_name,
+        prefix=prefix,
+        delimiter=delimiter,
+        fields=fields,
+        page_size=page_size,
+        **kwargs,
+    ):
+        if name_pattern and not name_pattern.search(blob.name):
+            continue
+        if updated_since and blob.updated <= updated_since:
+            continue
+        yield blob
+
+
+def list_prefixes(
+    bucket_name: str, prefix: str = None, delimiter: str = "/"
+) -> List[str]:
+    """Lists the "directories" directly below a prefix
+
+    Args:
+        bucket_name (str): The bucket to list
+        prefix (str, optional): The prefix to list below. Defaults to None.
+        delimiter (str, optional): The directory delimiter. Defaults to "/".
+
+    Returns:
+        List[str]: The prefixes below the prefix, ie ["reports/2023/", "reports/2024/"]
+    """
+    iterator = _client().list_blobs(
+        bucket_name,
+        prefix=prefix,
+        delimiter=delimiter,
+        fields="prefixes,nextPageToken",
+    )
+    for _ in iterator.pages:
+        pass
+    return sorted(iterator.prefixes)
+
+
 def list_blobs(
-    bucket_name: str, directory: str, client: storage.Client = storage.Client()
-):
-    """_summary_
+    bucket_name: str, directory: str, client: Optional[storage.Client] = None
+) -> List[storage.Blob]:
+    """Lists every blob below a directory. Use iter_blobs to list large directories
+    without holding every blob in memory
 
     Args:
-        client (storage.Client): _description_
-        bucket_name (str): _description_
-        directory (str): _description_
+        bucket_name (str): The bucket to list
+        directory (str): The directory to list
+        client (storage.Client, optional): The client to use. Defaults to the shared client.
 
     Returns:
-        _type_: _description_
+        List[storage.Blob]: The blobs
     """
-    return list(client.list_blobs(bucket_name, prefix=directory))
+    return list(iter_blobs(bucket_name, prefix=directory, client=client))
 
 
 def list_files(bucket_name: str, directory: str) -> List[str]:
@@ -65,44 +381,220 @@ def list_files(bucket_name: str, directory: str) -> List[str]:
     Returns:
         files (List[str]): The resulting list of files
     """
-    client = storage.Client()
     files = [
         f.name
-        for f in list_blobs(
-            client=client, bucket_name=bucket_name, directory=directory
-        )
+        for f in iter_blobs(bucket_name, prefix=directory, fields=["name"])
         if not f.name[-1] == "/"
     ]
     return files
 
 
 def download_to_stream(
-    bucket_name, file_path, file_object=BytesIO()
-) -> BytesIO:
-    """_summary_
+    bucket_name: str, file_path: str, file_object: Optional[BinaryIO] = None
+) -> BinaryIO:
+    """Downloads a blob into a file object, which is rewound and returned
 
     Args:
-        bucket_name (_type_): _description_
-        file_path (_type_): _description_
-        file_object (_type_, optional): _description_. Defaults to io.BytesIO().
+        bucket_name (str): The bucket to download from
+        file_path (str): The path of the blob
+        file_object (BinaryIO, optional): The file object to write to. Defaults to a new BytesIO.
 
     Returns:
-        io.BytesIO: _description_
+        BinaryIO: The file object containing the blob
     """
-    blob = storage.Client().bucket(bucket_name).blob(file_path)
+    if file_object is None:
+        file_object = BytesIO()
+    blob = _client().bucket(bucket_name).blob(file_path)
     blob.download_to_file(file_object)
     file_object.seek(0)
     return file_object
 
 
+def open_blob(
+    bucket_name: str,
+    file_path: str,
+    mode: str = "rb",
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+) -> Union[BlobReader, TextIOWrapper]:
+    """Opens a blob as a file-like object which downloads chunk_size bytes at a time, so
+    large objects can be read without holding them in memory
+
+    Args:
+        bucket_name (str): The bucket to read from
+        file_path (str): The path of the blob
+        mode (str, optional): "rb" for bytes or "r" for text. Defaults to "rb".
+        chunk_size (int, optional): How many bytes to download per request. Defaults to 8MB.
+
+    Returns:
+        Union[BlobReader, TextIOWrapper]: A readable file-like object
+
+    >>> with open_blob("bucket", "exports/orders.csv", mode="r") as f:
+    ...     df_chunks = pd.read_csv(f, chunksize=100000)
+    """
+    blob = _client().bucket(bucket_name).blob(file_path)
+    return blob.open(mode, chunk_size=chunk_size)
+
+
+def iter_blob_chunks(
+    bucket_name: str, file_path: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE
+) -> Generator[bytes, None, None]:
+    """Yields the contents of a blob in chunks
+
+    Args:
+        bucket_name (str): The bucket to read from
+        file_path (str): The path of the blob
+        chunk_size (int, optional): The size of each chunk. Defaults to 8MB.
+
+    Yields:
+        Generator[bytes, None, None]: Chunks of the blob
+    """
+    with open_blob(bucket_name, file_path, "rb", chunk_size) as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+def _download_slice(
+    blob: storage.Blob, dest_path: str, start: int, end: int
+) -> None:
+    with open(dest_path, "r+b") as f:
+        f.seek(start)
+        blob.download_to_file(f, start=start, end=end, checksum=None)
+
+
+def _sliced_download(
+    blob: storage.Blob, dest_path: str, slice_size: int, max_workers: int
+) -> None:
+    """Downloads byte ranges of a blob concurrently into a preallocated file, then
+    verifies the file against the blob's CRC32C checksum
+
+    Args:
+        blob (storage.Blob): The blob to download, with its properties loaded
+        dest_path (str): The local path to write to
+        slice_size (int): The size of each range
+        max_workers (int): How many ranges to download concurrently
+
+    Raises:
+        RuntimeError: Raised when the downloaded file's checksum doesn't match the blob
+    """
+    # Pin the generation so that every range reads the same version of the object
+    pinned = blob.bucket.blob(blob.name, generation=blob.generation)
+    with open(dest_path, "wb") as f:
+        f.truncate(blob.size)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                _download_slice,
+                pinned,
+                dest_path,
+                start,
+                min(start + slice_size, blob.size) - 1,
+            )
+            for start in range(0, blob.size, slice_size)
+        ]
+        for future in futures:
+            future.result()
+    if blob.crc32c and file_crc32c(dest_path) != blob.crc32c:
+        raise RuntimeError(
+            f"Checksum mismatch downloading gs://{blob.bucket.name}/{blob.name}"
+        )
+
+
 def download_file(
-        bucket_name:str, file_path:str, dest_path:str
-)->None:
-    """Download file from bucket to path"""
+    bucket_name: str,
+    file_path: str,
+    dest_path: str,
+    slice_threshold: int = SLICED_DOWNLOAD_THRESHOLD,
+    slice_size: int = SLICED_DOWNLOAD_SLICE_SIZE,
+    max_workers: int = 8,
+) -> None:
+    """Downloads a blob directly to a local file. Blobs larger than slice_threshold are
+    downloaded as byte ranges concurrently and verified against their CRC32C checksum
 
-    blob = storage.Client().bucket(bucket_name).blob(file_path)
-    blob.download_to_filename(dest_path)
-    return None
+    Args:
+        bucket_name (str): The bucket to download from
+        file_path (str): The path of the blob
+        dest_path (str): The local path to write to
+        slice_threshold (int, optional): The blob size above which ranges are downloaded concurrently. Defaults to 256MB.
+        slice_size (int, optional): The size of each range. Defaults to 64MB.
+        max_workers (int, optional): How many ranges to download concurrently. Defaults to 8.
+
+    Raises:
+        FileNotFoundError: Raised when the blob does not exist
+        RuntimeError: Raised when a sliced download's checksum doesn't match the blob
+    """
+    blob = _client().bucket(bucket_name).get_blob(file_path)
+    if blob is None:
+        raise FileNotFoundError(f"gs://{bucket_name}/{file_path} does not exist")
+    if blob.size > slice_threshold:
+        _sliced_download(blob, dest_path, slice_size, max_workers)
+    else:
+        blob.download_to_filename(dest_path, checksum="crc32c")
+    logger.info(f"gs://{bucket_name}/{file_path} -> {dest_path}")
+
+
+class AclResult(BaseModel):
+    """The result of changing the ACL of one blob in a bulk operation
+
+    Args:
+        name (str): The name of the blob
+        changed (bool): Whether the ACL was changed, False when it was already in the desired state
+        error (str): The error message when the change failed
+    """
+
+    name: str
+    changed: bool = False
+    error: Optional[str]
+
+
+def _validate_role(role: str) -> str:
+    if role.upper() not in ALLOWED_ROLES:
+        raise ValueError(f"Provided role must be one of {ALLOWED_ROLES}")
+    return role.upper()
+
+
+def _share_acl(acl: ObjectACL, user_email: str, role: str) -> bool:
+    """Grants a role in a loaded ACL unless the user already has it, without saving
+
+    Returns:
+        bool: Whether the ACL was changed
+    """
+    entity = acl.user(user_email)
+    if role in entity.get_roles():
+        return False
+    entity.grant(role)
+    return True
+
+
+def _unshare_acl(acl: ObjectACL, user_email: str, role: str = None) -> bool:
+    """Revokes a role, or every role, in a loaded ACL from a user who has it, without saving
+
+    Returns:
+        bool: Whether the ACL was changed
+    """
+    entity = acl.user(user_email)
+    roles = {role} if role else set(ALLOWED_ROLES)
+    if not roles & entity.get_roles():
+        return False
+    for r in roles:
+        entity.revoke(r)
+    return True
+
+
+def _listed_acl(blob: storage.Blob) -> ObjectACL:
+    """Loads a blob's ACL from the entries listed with it, instead of fetching it
+
+    Args:
+        blob (storage.Blob): A blob listed with projection="full"
+
+    Returns:
+        ObjectACL: The blob's ACL
+    """
+    # Marked loaded first, since adding entities to an unloaded ACL fetches it
+    blob.acl.loaded = True
+    blob.acl.entities.clear()
+    for entry in blob._properties.get("acl", []):
+        blob.acl.add_entity(blob.acl.entity_from_dict(entry))
+    return blob.acl
 
 
 def share(
@@ -119,12 +611,11 @@ def share(
         user_email (str): The user to share with
         role (str, optional): The role to grant that user (WRITER, READER or OWNER). Defaults to "READER".
     """
-    if role.upper() not in ALLOWED_ROLES:
-        raise ValueError(f"Provided role must be one of {ALLOWED_ROLES}")
-    blob = storage.Client().bucket(bucket_name).blob(cloud_storage_path)
+    role = _validate_role(role)
+    blob = _client().bucket(bucket_name).blob(cloud_storage_path)
     blob.acl.reload()
-    blob.acl.user(user_email).grant(role)
-    blob.acl.save()
+    if _share_acl(blob.acl, user_email, role):
+        blob.acl.save()
 
 
 def unshare(
@@ -141,17 +632,12 @@ def unshare(
         user_email (str): The user to revoke acl permissions for
         role (str, optional): The role to revoke from that user (WRITER, READER or OWNER). Defaults to None.
     """
-    blob = storage.Client().bucket(bucket_name).blob(cloud_storage_path)
-    blob.acl.reload()
     if role:
-        if role.upper() not in ALLOWED_ROLES:
-            raise ValueError(f"Provided role must be one of {ALLOWED_ROLES}")
-        blob.acl.user(user_email).revoke(role)
-    else:
-        blob.acl.user(user_email).revoke_read()
-        blob.acl.user(user_email).revoke_write()
-        blob.acl.user(user_email).revoke_owner()
-    blob.acl.save()
+        role = _validate_role(role)
+    blob = _client().bucket(bucket_name).blob(cloud_storage_path)
+    blob.acl.reload()
+    if _unshare_acl(blob.acl, user_email, role):
+        blob.acl.save()
 
 
 def get_shared(bucket_name: str, cloud_storage_path: str) -> List[ObjectACL]:
@@ -166,8 +652,307 @@ def get_shared(bucket_name: str, cloud_storage_path: str) -> List[ObjectACL]:
     """
 
     return (
-        storage.Client()
+        _client()
         .bucket(bucket_name)
         .blob(cloud_storage_path)
         .acl.get_entities()
     )
+
+
+def _update_acls(
+    bucket_name: str,
+    prefix: str,
+    update: Callable[[ObjectACL], bool],
+    max_workers: int,
+) -> List[AclResult]:
+    """Applies an ACL update to every blob below a prefix. The ACLs are listed together
+    with the blobs, and only the blobs whose ACL changes are saved, concurrently
+
+    Args:
+        bucket_name (str): The bucket to update
+        prefix (str): The prefix of the blobs to update
+        update (Callable[[ObjectACL], bool]): A function which updates an ACL in place and
+            returns whether it changed
+        max_workers (int): How many blobs to save concurrently
+
+    Returns:
+        List[AclResult]: The result for each blob
+    """
+
+    def save(blob: storage.Blob) -> AclResult:
+        try:
+            # Fails rather than overwriting an ACL which changed since it was listed
+            blob.acl.save(if_metageneration_match=blob.metageneration)
+            return AclResult(name=blob.name, changed=True)
+        except Exception as e:
+            logger.error(f"Updating the ACL of {blob.name} failed: {e}")
+            return AclResult(name=blob.name, error=str(e))
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        for blob in _client().list_blobs(
+            bucket_name,
+            prefix=prefix,
+            projection="full",
+            fields="items(name,metageneration,acl(entity,role)),nextPageToken",
+        ):
+            if update(_listed_acl(blob)):
+                futures.append(executor.submit(save, blob))
+            else:
+                results.append(AclResult(name=blob.name))
+        results.extend(future.result() for future in futures)
+    logger.info(
+        f"Changed the ACL of {sum(r.changed for r in results)} of {len(results)} blob(s) in gs://{bucket_name}/{prefix}"
+    )
+    return results
+
+
+def share_prefix(
+    bucket_name: str,
+    prefix: str,
+    user_email: str,
+    role: str = "READER",
+    max_workers: int = 16,
+) -> List[AclResult]:
+    """Shares every blob below a prefix with an email or google group concurrently,
+    skipping blobs which are already shared with that role
+
+    Args:
+        bucket_name (str): The bucket to share blobs from
+        prefix (str): The prefix of the blobs to share, ie "reports/2023-01/"
+        user_email (str): The user to share with
+        role (str, optional): The role to grant that user (WRITER, READER or OWNER). Defaults to "READER".
+        max_workers (int, optional): How many blobs to update concurrently. Defaults to 16.
+
+    Returns:
+        List[AclResult]: The result for each blob
+    """
+    role = _validate_role(role)
+    return _update_acls(
+        bucket_name,
+        prefix,
+        lambda acl: _share_acl(acl, user_email, role),
+        max_workers,
+    )
+
+
+def unshare_prefix(
+    bucket_name: str,
+    prefix: str,
+    user_email: str,
+    role: str = None,
+    max_workers: int = 16,
+) -> List[AclResult]:
+    """Unshares every blob below a prefix with an email or google group concurrently,
+    skipping blobs which the user has no matching role on
+
+    Args:
+        bucket_name (str): The bucket to unshare blobs from
+        prefix (str): The prefix of the blobs to unshare
+        user_email (str): The user to revoke acl permissions for
+        role (str, optional): The role to revoke from that user (WRITER, READER or OWNER). Defaults to every role.
+        max_workers (int, optional): How many blobs to update concurrently. Defaults to 16.
+
+    Returns:
+        List[AclResult]: The result for each blob
+    """
+    if role:
+        role = _validate_role(role)
+    return _update_acls(
+        bucket_name,
+        prefix,
+        lambda acl: _unshare_acl(acl, user_email, role),
+        max_workers,
+    )
+
+
+def get_shared_prefix(
+    bucket_name: str, prefix: str
+) -> Dict[str, List[Dict[str, str]]]:
+    """Returns the ACL entries of every blob below a prefix. The ACLs are listed
+    together with the blobs, instead of with a request per blob
+
+    Args:
+        bucket_name (str): The bucket to read blobs from
+        prefix (str): The prefix of the blobs
+
+    Returns:
+        Dict[str, List[Dict[str, str]]]: ACL entries, ie {"entity": "user-a@gogox.com", "role": "READER"},
+        keyed by blob name
+    """
+    return {
+        blob.name: [
+            {"entity": entry["entity"], "role": entry["role"]}
+            for entry in blob._properties.get("acl", [])
+        ]
+        for blob in _client().list_blobs(
+            bucket_name,
+            prefix=prefix,
+            projection="full",
+            fields="items(name,acl(entity,role)),nextPageToken",
+        )
+    }
+
+
+def upload_many(
+    files: Dict[str, str], bucket_name: str = None, max_workers: int = 8
+) -> List[TransferResult]:
+    """Uploads many local files concurrently. A failed upload doesn't stop the others;
+    its result has an error instead
+
+    Args:
+        files (Dict[str, str]): Destination paths on the bucket keyed by local path
+        bucket_name (str, optional): The bucket to upload to. Defaults to the BUCKET environment variable.
+        max_workers (int, optional): How many files to upload concurrently. Defaults to 8.
+
+    Returns:
+        List[TransferResult]: The result of each upload
+
+    >>> upload_many({"reports/a.csv": "monthly/a.csv", "reports/b.csv": "monthly/b.csv"})
+    """
+    bucket = _client().bucket(_bucket_name(bucket_name))
+
+    def upload(source: str, destination: str) -> None:
+        bucket.blob(destination).upload_from_filename(source)
+
+    return transfer_many("Uploaded", upload, files, max_workers)
+
+
+def download_many(
+    bucket_name: str, files: Dict[str, str], max_workers: int = 8
+) -> List[TransferResult]:
+    """Downloads many blobs to local files concurrently. A failed download doesn't stop
+    the others; its result has an error instead
+
+    Args:
+        bucket_name (str): The bucket to download from
+        files (Dict[str, str]): Local destination paths keyed by blob path
+        max_workers (int, optional): How many files to download concurrently. Defaults to 8.
+
+    Returns:
+        List[TransferResult]: The result of each download
+    """
+    bucket = _client().bucket(bucket_name)
+
+    def download(source: str, destination: str) -> None:
+        if os.path.dirname(destination):
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+        bucket.blob(source).download_to_filename(destination)
+
+    return transfer_many("Downloaded", download, files, max_workers)
+
+
+def _file_md5(local_path: str, chunk_size: int = 8 * 1024 * 1024) -> str:
+    md5 = hashlib.md5()
+    with open(local_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            md5.update(chunk)
+    return base64.b64encode(md5.digest()).decode("utf-8")
+
+
+def _file_matches_blob(local_path: str, blob: storage.Blob, compare: str) -> bool:
+    """Checks whether a local file has the same content as a blob
+
+    Args:
+        local_path (str): The local file
+        blob (storage.Blob): The blob, with its size and hashes loaded
+        compare (str): "size", "md5" or "crc32c". Blobs without an MD5 hash, like composed
+            objects, are compared by CRC32C instead
+
+    Returns:
+        bool: Whether the file and blob match
+    """
+    if os.path.getsize(local_path) != blob.size:
+        return False
+    if compare == "size":
+        return True
+    if compare == "md5" and blob.md5_hash:
+        return _file_md5(local_path) == blob.md5_hash
+    return file_crc32c(local_path) == blob.crc32c
+
+
+def sync_directory(
+    local_dir: str,
+    prefix: str,
+    bucket_name: str = None,
+    direction: str = "upload",
+    compare: str = "crc32c",
+    dry_run: bool = False,
+    max_workers: int = 8,
+) -> List[TransferResult]:
+    """Syncs a local directory with a prefix on Google Cloud Storage, only transferring
+    files which are missing or changed at the destination. Files are compared by size
+    first, and by checksum only when their sizes match
+
+    Args:
+        local_dir (str): The local directory
+        prefix (str): The prefix on the bucket, ie "reports/monthly"
+        bucket_name (str, optional): The bucket to sync with. Defaults to the BUCKET environment variable.
+        direction (str, optional): "upload" to copy local changes to the bucket or "download"
+            to copy bucket changes to the local directory. Defaults to "upload".
+        compare (str, optional): How files are compared: "size", "md5" or "crc32c". Defaults to "crc32c".
+        dry_run (bool, optional): Only return the transfers which would be made. Defaults to False.
+        max_workers (int, optional): How many files to compare and transfer concurrently. Defaults to 8.
+
+    Raises:
+        ValueError: Raised when the direction or compare method is invalid
+
+    Returns:
+        List[TransferResult]: The transfers made, or which would be made on a dry run
+
+    >>> sync_directory("output/reports", "reports/monthly", dry_run=True)
+    [TransferResult(source='output/reports/a.csv', destination='reports/monthly/a.csv', error=None)]
+    """
+    if direction not in SYNC_DIRECTIONS:
+        raise ValueError(f"Provided direction must be one of {SYNC_DIRECTIONS}")
+    if compare not in SYNC_COMPARISONS:
+        raise ValueError(f"Provided compare must be one of {SYNC_COMPARISONS}")
+    bucket_name = _bucket_name(bucket_name)
+    prefix = f"{prefix.rstrip('/')}/" if prefix else ""
+    blobs = {
+        blob.name[len(prefix) :]: blob
+        for blob in iter_blobs(
+            bucket_name, prefix=prefix, fields=["name", "size", "crc32c", "md5Hash"]
+        )
+        if not blob.name.endswith("/")
+    }
+    local_files = {}
+    for root, _, file_names in os.walk(local_dir):
+        for file_name in file_names:
+            local_path = os.path.join(root, file_name)
+            relative_path = os.path.relpath(local_path, local_dir)
+            local_files[relative_path.replace(os.sep, "/")] = local_path
+    if direction == "upload":
+        candidates = local_files
+    else:
+        candidates = {
+            name: os.path.join(local_dir, *name.split("/")) for name in blobs
+        }
+
+    def changed(name: str) -> bool:
+        if name not in blobs or name not in local_files:
+            return True
+        return not _file_matches_blob(local_files[name], blobs[name], compare)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        names = [
+            name
+            for name, is_changed in zip(candidates, executor.map(changed, candidates))
+            if is_changed
+        ]
+    if direction == "upload":
+        files = {local_files[name]: f"{prefix}{name}" for name in names}
+    else:
+        files = {f"{prefix}{name}": candidates[name] for name in names}
+    logger.info(
+        f"{len(files)} of {len(candidates)} file(s) changed between {local_dir} and gs://{bucket_name}/{prefix}"
+    )
+    if dry_run:
+        return [
+            TransferResult(source=source, destination=destination)
+            for source, destination in files.items()
+        ]
+    if direction == "upload":
+        return upload_many(files, bucket_name=bucket_name, max_workers=max_workers)
+    return download_many(bucket_name, files, max_workers=max_workers)
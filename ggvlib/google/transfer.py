@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+from pydantic import BaseModel
+from ggvlib.logging import logger
+
+
+class TransferResult(BaseModel):
+    """The result of transferring one file in a bulk operation
+
+    Args:
+        source (str): The path the file was read from
+        destination (str): The path the file was written to
+        error (str): The error message when the transfer failed
+    """
+
+    source: str
+    destination: str
+    error: Optional[str]
+
+
+def _log_progress(action: str, done: int, total: int) -> None:
+    if done == total or done % max(total // 10, 1) == 0:
+        logger.info(f"{action} {done}/{total} file(s)")
+
+
+def transfer_many(
+    action: str,
+    transfer: Callable[[str, str], None],
+    files: Dict[str, str],
+    max_workers: int,
+) -> List[TransferResult]:
+    """Runs a transfer function for many files concurrently, collecting errors per file
+
+    Args:
+        action (str): A description of the transfer used for logging
+        transfer (Callable[[str, str], None]): A function accepting a source and destination
+        files (Dict[str, str]): Destination paths keyed by source path
+        max_workers (int): How many files to transfer concurrently
+
+    Returns:
+        List[TransferResult]: The result of each transfer
+    """
+
+    def run(source: str, destination: str) -> TransferResult:
+        try:
+            transfer(source, destination)
+            return TransferResult(source=source, destination=destination)
+        except Exception as e:
+            logger.error(f"{action} {source} -> {destination} failed: {e}")
+            return TransferResult(source=source, destination=destination, error=str(e))
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(run, source, destination)
+            for source, destination in files.items()
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+            _log_progress(action, len(results), len(futures))
+    return results
@@ -0,0 +1,52 @@
+import itertools
+import string
+import pytest
+from ggvlib.google.a1 import (
+    A1Range,
+    column_to_index,
+    format_range,
+    index_to_column,
+    parse_range,
+    quote_sheet_name,
+    range_from_start,
+)
+
+
+def test_column_round_trip():
+    letters = (
+        "".join(group)
+        for n in (1, 2, 3)
+        for group in itertools.product(string.ascii_uppercase, repeat=n)
+    )
+    for index, column in enumerate(letters):
+        assert index_to_column(index) == column
+        assert column_to_index(column) == index
+
+
+def test_invalid_column():
+    with pytest.raises(ValueError):
+        column_to_index("A1")
+
+
+@pytest.mark.parametrize(
+    "a1,expected",
+    [
+        ("Sheet1", A1Range("Sheet1")),
+        ("B2", A1Range(None, 1, 2, 1, 2)),
+        ("Sheet1!A:C", A1Range("Sheet1", 0, None, 2, None)),
+        ("Sheet1!5:7", A1Range("Sheet1", None, 5, None, 7)),
+        ("'It''s here'!AA10:AB12", A1Range("It's here", 26, 10, 27, 12)),
+    ],
+)
+def test_parse_and_format_range(a1, expected):
+    assert parse_range(a1) == expected
+    assert format_range(expected) == a1
+
+
+def test_quote_sheet_name():
+    assert quote_sheet_name("Sheet1") == "Sheet1"
+    assert quote_sheet_name("Monthly KPIs") == "'Monthly KPIs'"
+
+
+def test_range_from_start():
+    assert str(range_from_start("Data!Y5", rows=10, cols=4)) == "Data!Y5:AB14"
@@ -0,0 +1,256 @@
+import datetime
+from decimal import Decimal
+import pandas as pd
+import pytest
+from ggvlib.google import bigquery
+from ggvlib.google.bigquery import (
+    _export_statement,
+    _fetch_result,
+    _insert_chunk,
+    _job_config,
+    _query_parameter,
+    _split_rows,
+    LocalStateStore,
+    StateStore,
+    compact_dtypes,
+    normalize_query,
+    set_maximum_bytes_billed,
+)
+
+
+class FakeClient:
+    def __init__(self, responses: list):
+        self.responses = responses
+        self.calls = []
+
+    def insert_rows_json(self, table, json_rows, row_ids):
+        self.calls.append((json_rows, row_ids))
+        return self.responses.pop(0)
+
+
+def test_split_rows_by_count():
+    data = [{"a": i} for i in range(5)]
+    chunks = list(_split_rows(data, None, max_rows=2, max_bytes=1000))
+    assert [offset for offset, _, _ in chunks] == [0, 2, 4]
+    assert sum(len(rows) for _, rows, _ in chunks) == 5
+
+
+def test_split_rows_by_size():
+    data = [{"a": "x" * 10} for _ in range(4)]
+    ids = [str(i) for i in range(4)]
+    chunks = list(_split_rows(data, ids, max_rows=100, max_bytes=40))
+    assert [len(rows) for _, rows, _ in chunks] == [2, 2]
+    assert chunks[1][2] == ["2", "3"]
+
+
+def test_split_rows_generates_insert_ids_once():
+    data = [{"a": i} for i in range(5)]
+    chunks = list(_split_rows(data, None, max_rows=2, max_bytes=1000))
+    ids = [row_id for _, _, chunk_ids in chunks for row_id in chunk_ids]
+    assert len(set(ids)) == 5
+    client = FakeClient([[{"index": 1, "errors": [{"reason": "backendError"}]}], []])
+    _, rows, chunk_ids = chunks[0]
+    _insert_chunk(client, "t", rows, chunk_ids, max_retries=1)
+    assert client.calls[1] == ([{"a": 1}], [chunk_ids[1]])
+
+
+def test_insert_chunk_retries_failed_rows_only():
+    client = FakeClient(
+        [
+            [
+                {"index": 0, "errors": [{"reason": "invalid"}]},
+                {"index": 2, "errors": [{"reason": "stopped"}]},
+            ],
+            [],
+        ]
+    )
+    rows = [{"a": 0}, {"a": 1}, {"a": 2}]
+    failed = _insert_chunk(client, "t", rows, ["a", "b", "c"], max_retries=1)
+    assert [e["index"] for e in failed] == [0]
+    assert client.calls[1] == ([{"a": 2}], ["c"])
+
+
+class FakeJob:
+    job_id = "job"
+    total_bytes_processed = 100
+    total_bytes_billed = 10485760
+    started = datetime.datetime(2023, 1, 1, 0, 0, 0)
+    ended = datetime.datetime(2023, 1, 1, 0, 0, 3)
+
+    def result(self):
+        return self
+
+    def to_dataframe(self, bqstorage_client=None):
+        return pd.DataFrame({"a": [1]})
+
+
+def test_fetch_result_times_the_job_itself():
+    result = _fetch_result("orders", FakeJob(), use_storage=False)
+    assert result.seconds == 3
+    assert result.fetch_seconds is not None
+    assert result.df["a"].tolist() == [1]
+
+
+def test_compact_dtypes():
+    df = pd.DataFrame(
+        {"a": ["x", "y"] * 50, "b": range(100), "c": [str(i) for i in range(100)]}
+    )
+    result = compact_dtypes(df)
+    assert result["a"].dtype == "category"
+    assert result["b"].dtype == "int8"
+    assert result["c"].dtype != "category"
+
+
+def test_compact_dtypes_skips_repeated_and_struct_columns():
+    df = pd.DataFrame(
+        {
+            "tags": [["x"], ["y"]] * 50,
+            "record": [{"a": 1}] * 100,
+            "mixed": ["x", 1] * 50,
+        }
+    )
+    result = compact_dtypes(df)
+    assert all(dtype == object for dtype in result.dtypes)
+
+
+def test_normalize_query():
+    assert (
+        normalize_query("SELECT  a,\n  'x  y'\nFROM t ;") == "SELECT a, 'x  y' FROM t"
+    )
+
+
+def test_query_parameter_types():
+    assert _query_parameter("a", True).type_ == "BOOL"
+    assert _query_parameter("a", 1).type_ == "INT64"
+    assert _query_parameter("a", datetime.date(2023, 1, 1)).type_ == "DATE"
+    assert _query_parameter("a", datetime.datetime(2023, 1, 1)).type_ == "DATETIME"
+    tz_aware = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+    assert _query_parameter("a", tz_aware).type_ == "TIMESTAMP"
+    assert _query_parameter("a", ["x", "y"]).array_type == "STRING"
+
+
+def test_job_config_maximum_bytes_billed():
+    set_maximum_bytes_billed(100)
+    assert _job_config().maximum_bytes_billed == 100
+    assert _job_config(maximum_bytes_billed=10).maximum_bytes_billed == 10
+    set_maximum_bytes_billed(None)
+    assert _job_config(params={"a": 1}).query_parameters[0].name == "a"
+
+
+def test_export_statement():
+    statement = _export_statement(
+        "SELECT 1",
+        "gs://b/p-*.parquet",
+        "parquet",
+        "snappy",
+        None,
+        True,
+        ",",
+        True,
+    )
+    assert "format='PARQUET'" in statement
+    assert "compression='SNAPPY'" in statement
+    assert "header" not in statement
+    assert "ORDER BY" not in statement
+
+
+class FakeExportJob:
+    job_id = "export"
+    started = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+    _properties = {
+        "statistics": {
+            "query": {"exportDataStatistics": {"fileCount": "1", "rowCount": "10"}}
+        }
+    }
+
+    def result(self):
+        return self
+
+
+@pytest.fixture()
+def exports(monkeypatch) -> list:
+    statements = []
+
+    def run_query(statement, params, maximum_bytes_billed):
+        statements.append(statement)
+        return FakeExportJob()
+
+    monkeypatch.setattr(bigquery, "_run_query", run_query)
+    monkeypatch.setattr(bigquery, "_list_export_objects", lambda *args: [])
+    return statements
+
+
+def test_export_to_storage_csv_defaults_to_no_compression(exports):
+    manifest = bigquery.export_to_storage("SELECT 1", "gs://b/x-*.csv", fmt="CSV")
+    assert manifest.compression is None
+    assert "compression" not in exports[0]
+    assert "format='CSV'" in exports[0]
+
+
+def test_export_to_storage_parquet_defaults_to_snappy(exports):
+    manifest = bigquery.export_to_storage("SELECT 1", "gs://b/x-*.parquet")
+    assert manifest.compression == "SNAPPY"
+    assert "compression='SNAPPY'" in exports[0]
+
+
+class FakeExportBlob:
+    def __init__(self, name: str, day: int):
+        self.name = name
+        self.size = 10
+        self.time_created = datetime.datetime(
+            2023, 1, day, tzinfo=datetime.timezone.utc
+        )
+
+
+def test_list_export_objects_skips_shards_of_earlier_exports(monkeypatch):
+    blobs = [
+        FakeExportBlob("x-000000000000.parquet", 2),
+        FakeExportBlob("x-000000000007.parquet", 1),
+        FakeExportBlob("x.json", 2),
+    ]
+    fake_client = type("FakeStorageClient", (), {"list_blobs": lambda *a, **k: blobs})
+    monkeypatch.setattr(bigquery.storage, "Client", fake_client)
+    objects = bigquery._list_export_objects(
+        "gs://b/x-*.parquet",
+        datetime.datetime(2023, 1, 2, tzinfo=datetime.timezone.utc),
+    )
+    assert [o.uri for o in objects] == ["gs://b/x-000000000000.parquet"]
+
+
+def test_local_state_store(tmp_path):
+    store = LocalStateStore(str(tmp_path / "state.json"))
+    assert store.get("events") is None
+    watermark = pd.Timestamp("2023-01-02 03:04:05", tz="UTC")
+    store.set("events", watermark)
+    store.set("days", datetime.date(2023, 1, 1))
+    assert store.get("events") == watermark.to_pydatetime()
+    assert store.get("days") == datetime.date(2023, 1, 1)
+
+
+def test_local_state_store_keeps_decimal_precision(tmp_path):
+    store = LocalStateStore(str(tmp_path / "state.json"))
+    store.set("balance", Decimal("12345678901234567890.123456789"))
+    assert LocalStateStore(store.path).get("balance") == Decimal(
+        "12345678901234567890.123456789"
+    )
+
+
+def test_query_incremental_requires_watermark_parameter(tmp_path):
+    store = LocalStateStore(str(tmp_path / "state.json"))
+    for query_rows in (bigquery.query_incremental, bigquery.iter_query_incremental):
+        with pytest.raises(ValueError, match="@watermark"):
+            list(
+                query_rows(
+                    "SELECT * FROM events WHERE event_time > @watermark_start",
+                    "events",
+                    "event_time",
+                    store,
+                    datetime.date(2023, 1, 1),
+                )
+            )
+    assert store.get("events") is None
+
+
+def test_state_store_is_abstract():
+    with pytest.raises(TypeError):
+        StateStore()
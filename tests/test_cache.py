@@ -0,0 +1,40 @@
+import os
+import time
+import pandas as pd
+from ggvlib.cache import ParquetCache, TTLCache
+
+
+def test_parquet_cache_roundtrip(tmp_path):
+    cache = ParquetCache(str(tmp_path))
+    df = pd.DataFrame({"a": [1, 2], "b": ["x", "y"]})
+    assert cache.get("key") is None
+    cache.set("key", df)
+    pd.testing.assert_frame_equal(cache.get("key"), df)
+
+
+def test_parquet_cache_ttl(tmp_path):
+    cache = ParquetCache(str(tmp_path), ttl=60)
+    cache.set("key", pd.DataFrame({"a": [1]}))
+    expired = time.time() - 120
+    os.utime(tmp_path / "key.parquet", (expired, expired))
+    assert cache.get("key") is None
+
+
+def test_parquet_cache_evicts_least_recently_used(tmp_path):
+    cache = ParquetCache(str(tmp_path))
+    for i, key in enumerate(["old", "new"]):
+        cache.set(key, pd.DataFrame({"a": range(100)}))
+        used = time.time() - 10 + i
+        os.utime(tmp_path / f"{key}.parquet", (used, time.time()))
+    cache.max_bytes = (tmp_path / "new.parquet").stat().st_size
+    cache.evict()
+    assert cache.get("old") is None
+    assert cache.get("new") is not None
+
+
+def test_ttl_cache_expires():
+    cache = TTLCache(ttl=60)
+    cache.set("key", 1)
+    assert cache.get("key") == 1
+    cache.ttl = -1
+    assert cache.get("key", "missing") == "missing"
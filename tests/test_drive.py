@@ -0,0 +1,165 @@
+import pytest
+from ggvlib.google import drive
+
+
+class FakeRequest:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+class FakeFiles:
+    def __init__(self, folders: dict, page_size: int):
+        self.folders = folders
+        self.page_size = page_size
+        self.calls = []
+        self.uploads = []
+
+    def get(self, fileId, **kwargs):
+        self.calls.append({"get": fileId})
+        return FakeRequest(item(fileId))
+
+    def create(self, body, media_body, **kwargs):
+        self.calls.append({"create": body, "media": media_body, **kwargs})
+        upload = FakeUpload(body["name"])
+        self.uploads.append(upload)
+        return upload
+
+    def get_media(self, fileId, **kwargs):
+        return fileId
+
+    def list(self, q, pageToken=None, **kwargs):
+        self.calls.append({"q": q, "pageToken": pageToken, **kwargs})
+        items = self.folders[q.split('"')[1]]
+        start = int(pageToken or 0)
+        response = {"files": items[start : start + self.page_size]}
+        if start + self.page_size < len(items):
+            response["nextPageToken"] = str(start + self.page_size)
+        return FakeRequest(response)
+
+
+class FakeStatus:
+    def progress(self) -> float:
+        return 1.0
+
+
+class FakeUpload:
+    def __init__(self, name: str):
+        self.name = name
+        self.chunks = 3
+        self.retries = []
+
+    def next_chunk(self, num_retries=0):
+        self.retries.append(num_retries)
+        self.chunks -= 1
+        if self.chunks > 0:
+            return FakeStatus(), None
+        return None, {"id": self.name}
+
+
+class FakeService:
+    def __init__(self, files: FakeFiles):
+        self._files = files
+
+    def files(self) -> FakeFiles:
+        return self._files
+
+
+def item(item_id: str, folder: bool = False) -> dict:
+    mime_type = drive.FOLDER_MIMETYPE if folder else "text/csv"
+    return {"id": item_id, "name": item_id, "mimeType": mime_type}
+
+
+@pytest.fixture()
+def files(monkeypatch) -> FakeFiles:
+    files = FakeFiles(
+        {
+            "root": [item("a", folder=True), item("f1"), item("f2"), item("f3")],
+            "a": [item("b", folder=True), item("f4")],
+            "b": [item("f5")],
+        },
+        page_size=2,
+    )
+    monkeypatch.setattr(drive, "_service", lambda: FakeService(files))
+    return files
+
+
+def test_list_files_in_directory_follows_every_page(files):
+    items = list(drive.list_files_in_directory("root"))
+    assert [i["id"] for i in items] == ["a", "f1", "f2", "f3"]
+    assert [call["pageToken"] for call in files.calls] == [None, "2"]
+    assert files.calls[0]["fields"] == "nextPageToken, files(id, name)"
+    assert files.calls[0]["supportsAllDrives"]
+
+
+def test_list_files_in_directory_walks_subfolders(files):
+    items = drive.list_files_in_directory("root", recursive=True, drive_id="drive")
+    assert sorted(i["id"] for i in items) == ["a", "b", "f1", "f2", "f3", "f4", "f5"]
+    assert files.calls[0]["fields"] == "nextPageToken, files(id, name, mimeType)"
+    assert all(call["driveId"] == "drive" for call in files.calls)
+
+
+class FakeDownload:
+    def __init__(self, file_handler, request, chunksize):
+        self.file_handler = file_handler
+        self.request = request
+        self.chunks = [b"a,b\n", b"1,2\n"]
+
+    def next_chunk(self, num_retries=0):
+        if self.request == "broken":
+            self.file_handler.write(b"a,b\n")
+            raise ConnectionError("reset")
+        self.file_handler.write(self.chunks.pop(0))
+        return FakeStatus(), not self.chunks
+
+
+@pytest.fixture()
+def downloads(monkeypatch, files) -> FakeFiles:
+    monkeypatch.setattr(drive, "MediaIoBaseDownload", FakeDownload)
+    drive._item_cache.clear()
+    return files
+
+
+def test_download_file_streams_to_disk_and_caches_metadata(downloads, tmp_path):
+    assert drive.download_file("f1").getvalue() == b"a,b\n1,2\n"
+    local_path = str(tmp_path / "f1.csv")
+    assert drive.download_file("f1", local_path) == local_path
+    assert (tmp_path / "f1.csv").read_bytes() == b"a,b\n1,2\n"
+    assert [call for call in downloads.calls if "get" in call] == [{"get": "f1"}]
+
+
+def test_download_many_leaves_no_partial_files(downloads, tmp_path):
+    results = drive.download_many(
+        {"f1": str(tmp_path / "f1.csv"), "broken": str(tmp_path / "broken.csv")}
+    )
+    errors = {r.source: r.error for r in results}
+    assert errors == {"f1": None, "broken": "reset"}
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["f1.csv"]
+
+
+@pytest.fixture()
+def uploads(monkeypatch, files) -> FakeFiles:
+    monkeypatch.setattr(drive, "MediaFileUpload", lambda **kwargs: kwargs)
+    return files
+
+
+def test_upload_file_sends_resumable_chunks(uploads, tmp_path):
+    response = drive.upload_file("a.csv", str(tmp_path / "a.csv"), "folder")
+    assert response == {"id": "a.csv"}
+    call = uploads.calls[0]
+    assert call["create"]["parents"] == ["folder"]
+    assert call["media"]["resumable"]
+    assert call["media"]["chunksize"] == drive.UPLOAD_CHUNK_SIZE
+    assert uploads.uploads[0].retries == [drive.NUM_RETRIES] * 3
+
+
+def test_upload_many_uploads_files_in_a_directory(uploads, tmp_path):
+    (tmp_path / "a.csv").write_text("a")
+    (tmp_path / "b.json").write_text("{}")
+    (tmp_path / "nested").mkdir()
+    results = drive.upload_many(str(tmp_path), "folder")
+    assert sorted(r.destination for r in results if not r.error) == ["a.csv", "b.json"]
+    mime_types = {c["create"]["name"]: c["create"]["mimeType"] for c in uploads.calls}
+    assert mime_types == {"a.csv": "text/csv", "b.json": "application/json"}
@@ -0,0 +1,132 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from ggvlib.google import sheets
+from ggvlib.google.sheets import (
+    _changed_cells,
+    _changed_rectangles,
+    _df_values,
+    _split_value_range,
+    _values_to_df,
+)
+
+
+def test_df_values_serializes_missing_values_and_dates():
+    df = pd.DataFrame(
+        {
+            "day": pd.to_datetime(["2023-01-01", None]),
+            "amount": [np.nan, 2.5],
+            "count": [1, 2],
+        }
+    )
+    values = _df_values(df)
+    assert values == [["2023-01-01", "", 1], ["", 2.5, 2]]
+    json.dumps(values, allow_nan=False)
+
+
+def test_split_value_range_into_row_bands():
+    value_ranges = _split_value_range(
+        "Sheet1!B3:C6", [[1, 2], [3, 4], [5, 6], [7, 8]], max_bytes=14
+    )
+    assert [v["range"] for v in value_ranges] == ["Sheet1!B3:C4", "Sheet1!B5:C6"]
+
+
+def test_values_to_df_uses_header_row_and_pads_ragged_rows():
+    values = [["title"], ["a", "b", "day"], [1, "x", 45000], [2.5]]
+    df = _values_to_df(values, header_row=1, typed=True, date_columns=["day"])
+    assert list(df.columns) == ["a", "b", "day"]
+    assert df["a"].tolist() == [1.0, 2.5]
+    assert df["day"][0] == pd.Timestamp("2023-03-15")
+    assert pd.isna(df["b"][1])
+
+
+def test_changed_cells_compares_numbers_and_date_serials():
+    df = pd.DataFrame(
+        {
+            "n": [1, 2],
+            "day": pd.to_datetime(["2023-01-01", "2023-01-02"]),
+            "s": ["x", "y"],
+        }
+    )
+    current = [[1.0, 44927, "x"], [2]]
+    mask = _changed_cells(current, _df_values(df), date_columns=[1])
+    assert mask.tolist() == [[False, False, False], [False, True, True]]
+
+
+def test_changed_cells_compares_large_numbers_exactly():
+    current = [[12345600, 1000005, 7]]
+    new = [[12345678, 1000000, 7.0]]
+    assert _changed_cells(current, new, date_columns=[]).tolist() == [
+        [True, True, False]
+    ]
+    assert _changed_cells(current, new, date_columns=[], atol=100).tolist() == [
+        [False, False, False]
+    ]
+
+
+def test_changed_rectangles_merges_identical_runs():
+    mask = np.array(
+        [[0, 1, 1, 0], [0, 1, 1, 0], [1, 0, 0, 0], [0, 0, 0, 1]], dtype=bool
+    )
+    assert sorted(_changed_rectangles(mask)) == [
+        (0, 1, 1, 2),
+        (2, 0, 2, 0),
+        (3, 3, 3, 3),
+    ]
+
+
+@pytest.fixture()
+def batch_updates(monkeypatch) -> list:
+    calls = []
+
+    def batch_update(sheet_id, value_ranges, value_input_option):
+        calls.append((value_input_option, value_ranges))
+        return {"spreadsheetId": sheet_id}
+
+    monkeypatch.setattr(sheets, "_batch_update", batch_update)
+    return calls
+
+
+def test_update_ranges_writes_dates_and_formulas_as_user_entered(batch_updates):
+    dates = pd.DataFrame({"day": pd.to_datetime(["2023-01-01"]), "n": [1]})
+    text = pd.DataFrame({"code": ["2023-01-01"], "n": [1]})
+    sheets.update_ranges(
+        "id",
+        {
+            "Sheet1!A1": dates,
+            "Sheet2!A1": text,
+            "Sheet3!A1:A1": [["=SUM(B1:B2)"]],
+        },
+    )
+    options = {
+        option: [value_range["range"] for value_range in value_ranges]
+        for option, value_ranges in batch_updates
+    }
+    assert options == {
+        "RAW": ["Sheet2!A1:B1"],
+        "USER_ENTERED": ["Sheet1!A1:B1", "Sheet3!A1"],
+    }
+
+
+def test_update_ranges_packs_ranges_below_max_request_bytes(batch_updates):
+    data = {f"Sheet1!A{i}:B{i}": [["x" * 10, i]] for i in range(1, 5)}
+    sheets.update_ranges("id", data, value_input_option="RAW", max_request_bytes=120)
+    assert [len(value_ranges) for _, value_ranges in batch_updates] == [2, 2]
+    assert [
+        value_range["range"]
+        for _, value_ranges in batch_updates
+        for value_range in value_ranges
+    ] == list(data)
+
+
+def test_get_ranges_returns_empty_dataframes_for_blank_ranges(monkeypatch):
+    value_ranges = [{"values": [["a"], [1]]}, {}]
+    monkeypatch.setattr(
+        sheets, "batch_get_ranges", lambda *args, **kwargs: value_ranges
+    )
+    dfs = sheets.get_ranges("id", ["KPIs!A:B", "Blank!A:B"])
+    assert dfs["KPIs!A:B"]["a"].tolist() == [1]
+    assert dfs["Blank!A:B"].empty
+    with pytest.raises(Exception, match="no data"):
+        sheets.get_ranges("id", ["KPIs!A:B", "Blank!A:B"], raise_on_empty=True)
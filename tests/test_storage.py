@@ -0,0 +1,286 @@
+import base64
+import datetime
+import gzip
+import hashlib
+import io
+import google_crc32c
+import pytest
+from google.cloud import storage as gcs
+from google.cloud.storage.acl import ObjectACL
+from ggvlib.google import storage
+
+
+class FakeWriter:
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self.data = b""
+        self.finalized = False
+
+    def write(self, data: bytes) -> int:
+        self.data += data
+        return len(data)
+
+    def close(self) -> None:
+        self.finalized = True
+
+
+class FakeBlob:
+    def __init__(self, name: str, data: bytes = b"", bucket=None):
+        self.name = name
+        self.data = data
+        self.bucket = bucket
+        self.generation = 1
+        self.writer = FakeWriter()
+        self.deleted = False
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    @property
+    def crc32c(self) -> str:
+        checksum = google_crc32c.Checksum(self.data).digest()
+        return base64.b64encode(checksum).decode("utf-8")
+
+    @property
+    def md5_hash(self) -> str:
+        return base64.b64encode(hashlib.md5(self.data).digest()).decode("utf-8")
+
+    def open(self, mode, **kwargs):
+        return self.writer
+
+    def upload_from_file(self, f, size, checksum=None) -> None:
+        self.data = f.read(size)
+
+    def upload_from_filename(self, filename: str) -> None:
+        with open(filename, "rb") as f:
+            self.data = f.read()
+
+    def compose(self, sources) -> None:
+        self.data = b"".join(source.data for source in sources)
+
+    def download_to_file(self, f, start, end, checksum=None) -> None:
+        f.write(self.data[start : end + 1])
+
+    def delete(self) -> None:
+        self.deleted = True
+
+
+class FakeBucket:
+    name = "bucket"
+
+    def __init__(self):
+        self.blobs = {}
+
+    def blob(self, name: str, **kwargs) -> FakeBlob:
+        return self.blobs.setdefault(name, FakeBlob(name, bucket=self))
+
+
+class FakeClient:
+    def __init__(self):
+        self.fake_bucket = FakeBucket()
+        self.listed = []
+        self.list_calls = []
+
+    def bucket(self, name: str) -> FakeBucket:
+        return self.fake_bucket
+
+    def list_blobs(self, bucket_name, **kwargs):
+        self.list_calls.append(kwargs)
+        return iter(self.listed)
+
+
+@pytest.fixture()
+def client(monkeypatch) -> FakeClient:
+    client = FakeClient()
+    monkeypatch.setattr(storage, "_client", lambda: client)
+    return client
+
+
+def test_upload_ndjson_compresses_rows(client):
+    count = storage.upload_ndjson([{"a": 1}, {"a": 2}], "rows.json.gz", "bucket")
+    writer = client.fake_bucket.blobs["rows.json.gz"].writer
+    assert count == 2
+    assert writer.finalized
+    assert gzip.decompress(writer.data) == b'{"a": 1}\n{"a": 2}\n'
+
+
+def test_upload_ndjson_does_not_finalize_on_error(client):
+    def rows():
+        yield {"a": 1}
+        raise ConnectionError("export failed")
+
+    with pytest.raises(ConnectionError, match="export failed"):
+        storage.upload_ndjson(rows(), "rows.json.gz", "bucket")
+    blob = client.fake_bucket.blobs["rows.json.gz"]
+    assert not blob.writer.finalized
+    assert blob.writer._buffer.closed
+    assert not blob.deleted
+
+
+def listed_blob(name: str, acl: list) -> gcs.Blob:
+    blob = gcs.Blob(name, gcs.Bucket(None, "bucket"))
+    blob._set_properties({"name": name, "metageneration": "3", "acl": acl})
+    return blob
+
+
+@pytest.fixture()
+def saved_acls(monkeypatch) -> list:
+    saved = []
+
+    def save(acl, **kwargs):
+        saved.append(
+            (acl.blob.name, kwargs, sorted(acl.user("a@gogox.com").get_roles()))
+        )
+
+    monkeypatch.setattr(ObjectACL, "save", save)
+    return saved
+
+
+def test_share_prefix_only_saves_changed_acls(client, saved_acls):
+    client.listed = [
+        listed_blob("shared.csv", [{"entity": "user-a@gogox.com", "role": "READER"}]),
+        listed_blob("private.csv", [{"entity": "user-b@gogox.com", "role": "OWNER"}]),
+    ]
+    results = storage.share_prefix("bucket", "reports/", "a@gogox.com")
+    assert client.list_calls[0]["projection"] == "full"
+    assert {r.name: r.changed for r in results} == {
+        "shared.csv": False,
+        "private.csv": True,
+    }
+    assert saved_acls == [("private.csv", {"if_metageneration_match": 3}, ["READER"])]
+
+
+def test_unshare_prefix_skips_blobs_without_the_role(client, saved_acls):
+    client.listed = [
+        listed_blob("shared.csv", [{"entity": "user-a@gogox.com", "role": "WRITER"}]),
+        listed_blob("private.csv", []),
+    ]
+    results = storage.unshare_prefix("bucket", "reports/", "a@gogox.com")
+    assert [r.name for r in results if r.changed] == ["shared.csv"]
+    assert saved_acls == [("shared.csv", {"if_metageneration_match": 3}, [])]
+
+
+def test_composite_upload_splits_file_into_parts(monkeypatch, tmp_path):
+    monkeypatch.setattr(storage, "COMPOSITE_UPLOAD_MIN_PART_SIZE", 10)
+    monkeypatch.setattr(storage, "MAX_COMPOSE_COMPONENTS", 4)
+    local_path = tmp_path / "data.csv"
+    local_path.write_bytes(bytes(range(55)))
+    bucket = FakeBucket()
+    storage._composite_upload(bucket, str(local_path), "data.csv", None, 2)
+    parts = [bucket.blobs[name] for name in sorted(bucket.blobs) if name != "data.csv"]
+    assert [part.size for part in parts] == [14, 14, 14, 13]
+    assert all(part.deleted for part in parts)
+    assert bucket.blobs["data.csv"].data == bytes(range(55))
+    assert bucket.blobs["data.csv"].content_type == "text/csv"
+
+
+def test_sliced_download_reassembles_ranges(tmp_path):
+    bucket = FakeBucket()
+    blob = bucket.blob("data.bin")
+    blob.data = bytes(range(256)) * 3
+    dest_path = tmp_path / "data.bin"
+    storage._sliced_download(blob, str(dest_path), slice_size=100, max_workers=3)
+    assert dest_path.read_bytes() == blob.data
+
+
+def test_sliced_download_checks_crc32c(monkeypatch, tmp_path):
+    bucket = FakeBucket()
+    blob = bucket.blob("data.bin")
+    blob.data = b"x" * 250
+    monkeypatch.setattr(FakeBlob, "crc32c", "AAAAAA==")
+    with pytest.raises(RuntimeError, match="Checksum mismatch"):
+        storage._sliced_download(blob, str(tmp_path / "data.bin"), 100, 2)
+
+
+def test_iter_blobs_projects_fields_and_derives_prefix(client):
+    client.listed = [
+        FakeBlob("reports/2023-01/a.csv"),
+        FakeBlob("reports/2023-01/b.csv"),
+    ]
+    blobs = storage.iter_blobs(
+        "bucket",
+        match_glob="reports/2023-*/**.csv",
+        fields=["size"],
+        pattern=r"a\.csv$",
+    )
+    assert [blob.name for blob in blobs] == ["reports/2023-01/a.csv"]
+    kwargs = client.list_calls[0]
+    assert kwargs["prefix"] == "reports/2023-"
+    assert kwargs["match_glob"] == "reports/2023-*/**.csv"
+    assert kwargs["fields"] == "items(name,size),prefixes,nextPageToken"
+
+
+def test_iter_blobs_fetches_updated_for_updated_since(client):
+    blob = FakeBlob("a.csv")
+    blob.updated = datetime.datetime(2023, 1, 2, tzinfo=datetime.timezone.utc)
+    client.listed = [blob]
+    since = datetime.datetime(2023, 1, 1)
+    assert list(storage.iter_blobs("bucket", fields=["name"], updated_since=since))
+    assert not list(storage.iter_blobs("bucket", updated_since=blob.updated))
+    naive_updated = datetime.datetime(2023, 1, 2)
+    assert not list(storage.iter_blobs("bucket", updated_since=naive_updated))
+    assert (
+        client.list_calls[0]["fields"] == "items(name,updated),prefixes,nextPageToken"
+    )
+    assert client.list_calls[1]["fields"] is None
+
+
+@pytest.fixture()
+def sync_dirs(client, tmp_path):
+    (tmp_path / "same.csv").write_bytes(b"a,b\n1,2\n")
+    (tmp_path / "changed.csv").write_bytes(b"a,b\n1,3\n")
+    (tmp_path / "new.csv").write_bytes(b"a\n")
+    client.listed = [
+        FakeBlob("reports/same.csv", b"a,b\n1,2\n"),
+        FakeBlob("reports/changed.csv", b"a,b\n1,2\n"),
+        FakeBlob("reports/remote.csv", b"b\n"),
+        FakeBlob("reports/", b""),
+    ]
+    return tmp_path
+
+
+def planned(results) -> set:
+    return {(r.source, r.destination) for r in results}
+
+
+def test_sync_directory_plans_uploads(sync_dirs):
+    results = storage.sync_directory(str(sync_dirs), "reports", "bucket", dry_run=True)
+    assert planned(results) == {
+        (str(sync_dirs / "changed.csv"), "reports/changed.csv"),
+        (str(sync_dirs / "new.csv"), "reports/new.csv"),
+    }
+    results = storage.sync_directory(
+        str(sync_dirs), "reports", "bucket", compare="size", dry_run=True
+    )
+    assert planned(results) == {(str(sync_dirs / "new.csv"), "reports/new.csv")}
+
+
+def test_sync_directory_plans_downloads(sync_dirs):
+    results = storage.sync_directory(
+        str(sync_dirs), "reports/", "bucket", direction="download", dry_run=True
+    )
+    assert planned(results) == {
+        ("reports/changed.csv", str(sync_dirs / "changed.csv")),
+        ("reports/remote.csv", str(sync_dirs / "remote.csv")),
+    }
+
+
+def test_sync_directory_validates_options(sync_dirs):
+    with pytest.raises(ValueError):
+        storage.sync_directory(str(sync_dirs), "reports", "bucket", direction="both")
+    with pytest.raises(ValueError):
+        storage.sync_directory(str(sync_dirs), "reports", "bucket", compare="mtime")
+
+
+def test_upload_many_collects_errors_per_file(client, tmp_path):
+    (tmp_path / "a.csv").write_bytes(b"a\n")
+    files = {
+        str(tmp_path / "a.csv"): "reports/a.csv",
+        str(tmp_path / "missing.csv"): "reports/missing.csv",
+    }
+    results = storage.upload_many(files, bucket_name="bucket", max_workers=2)
+    errors = {r.destination: r.error for r in results}
+    assert errors["reports/a.csv"] is None
+    assert "missing.csv" in errors["reports/missing.csv"]
+    assert client.fake_bucket.blobs["reports/a.csv"].data == b"a\n"